@@ -0,0 +1,102 @@
+from collections import defaultdict
+
+import sqlalchemy as sa
+from flask import request
+from flask_restful import abort, Resource
+
+from api.logic import DAY_MS, HOUR_MS, format_date, parse_date
+from data.courier_type_day_stats import CourierTypeDayStats
+from data.courier_type_hour_stats import CourierTypeHourStats
+from data.db_session import create_session, increment
+from data.region_day_stats import RegionDayStats
+from data.region_hour_stats import RegionHourStats
+
+STEPS = {'hour': (RegionHourStats, RegionHourStats.hour, HOUR_MS), 'day': (RegionDayStats, RegionDayStats.day, DAY_MS)}
+COURIER_TYPE_STEPS = {'hour': (CourierTypeHourStats, CourierTypeHourStats.hour, HOUR_MS),
+                      'day': (CourierTypeDayStats, CourierTypeDayStats.day, DAY_MS)}
+# Longer ranges are shown by day unless asked otherwise, an hourly series reads every region's bucket of every hour
+HOURLY_RANGE = 7 * DAY_MS
+
+
+def record_completion(session, region, courier_type, complete_time: int, seconds):
+    """Counts an order of region delivered in seconds by a courier of courier_type into the buckets of complete_time."""
+    increment(session, RegionHourStats, {'region': region, 'hour': complete_time // HOUR_MS},
+              {'count': 1, 'total': seconds})
+    increment(session, RegionDayStats, {'region': region, 'day': complete_time // DAY_MS},
+              {'count': 1, 'total': seconds})
+    increment(session, CourierTypeHourStats, {'courier_type': courier_type, 'hour': complete_time // HOUR_MS},
+              {'orders': 1})
+    increment(session, CourierTypeDayStats, {'courier_type': courier_type, 'day': complete_time // DAY_MS},
+              {'orders': 1})
+
+
+def region_totals(session, step, start: int, end: int, region=None):
+    """(region, count, total) sums of the step buckets from start to end, both multiples of the step."""
+    model, bucket, size = STEPS[step]
+    if start >= end:
+        return []
+    query = session.query(model.region, sa.func.sum(model.count), sa.func.sum(model.total)) \
+        .filter(bucket >= start // size, bucket < end // size)
+    if region is not None:
+        query = query.filter(model.region == region)
+    return query.group_by(model.region)
+
+
+def courier_type_totals(session, step, start: int, end: int):
+    """(courier_type, orders, deliveries, earnings) sums of the step buckets from start to end, both multiples of the
+    step."""
+    model, bucket, size = COURIER_TYPE_STEPS[step]
+    if start >= end:
+        return []
+    return session.query(model.courier_type, sa.func.sum(model.orders), sa.func.sum(model.deliveries),
+                         sa.func.sum(model.earnings)) \
+        .filter(bucket >= start // size, bucket < end // size).group_by(model.courier_type)
+
+
+class AnalyticsResource(Resource):
+    """/analytics"""
+
+    def get(self):
+        try:
+            start, end = parse_date(request.args['from']), parse_date(request.args['to'])
+            region = int(request.args['region']) if 'region' in request.args else None
+            step = request.args.get('step', 'hour' if end - start <= HOURLY_RANGE else 'day')
+            model, bucket, size = STEPS[step]
+        except (KeyError, ValueError):
+            abort(400)
+        if start >= end:
+            abort(400)
+        session = create_session()
+        # The range is widened to whole steps
+        first, last = start // size, -(-end // size)
+        start, end = first * size, last * size
+
+        # Whole days are read from the day buckets, only the hours around them from the hour buckets, for the regions
+        # and the courier types alike
+        first_day, last_day = -(-start // DAY_MS) * DAY_MS, end // DAY_MS * DAY_MS
+        if first_day < last_day:
+            parts = [('day', first_day, last_day), ('hour', start, first_day), ('hour', last_day, end)]
+        else:
+            parts = [('hour', start, end)]
+        regions = defaultdict(lambda: [0, 0])
+        courier_types = defaultdict(lambda: [0, 0, 0])
+        for part_step, part_start, part_end in parts:
+            for region_id, count, total in region_totals(session, part_step, part_start, part_end, region):
+                regions[region_id][0] += int(count)
+                regions[region_id][1] += int(total)
+            for courier_type, *amounts in courier_type_totals(session, part_step, part_start, part_end):
+                for i, amount in enumerate(amounts):
+                    courier_types[courier_type][i] += int(amount)
+
+        series = session.query(bucket, sa.func.sum(model.count)).filter(bucket >= first, bucket < last)
+        if region is not None:
+            series = series.filter(model.region == region)
+        series = series.group_by(bucket).order_by(bucket)
+
+        return {'from': format_date(start), 'to': format_date(end), 'step': step,
+                'regions': [{'region': region_id, 'orders': count, 'average_delivery_time': total / count}
+                            for region_id, (count, total) in sorted(regions.items())],
+                'series': [{'start': format_date(moment * size), 'orders': int(count)} for moment, count in series],
+                'courier_types': [{'courier_type': courier_type, 'orders': orders, 'deliveries': deliveries,
+                                   'earnings': earnings}
+                                  for courier_type, (orders, deliveries, earnings) in sorted(courier_types.items())]}, 200
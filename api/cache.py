@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy.orm import object_session
+
+from config import COURIER_CACHE_REDIS, COURIER_CACHE_SIZE, COURIER_CACHE_TTL, WORKERS
+from data.db_session import on_commit
+
+
+class LocalCache:
+    """LRU cache of at most size entries, each of which is dropped ttl seconds after it was set."""
+
+    def __init__(self, size, ttl, clock=time.monotonic):
+        self.size, self.ttl, self.clock = size, ttl, clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > self.clock():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        if self.size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (self.clock() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': len(self.entries)}
+
+
+class SharedCache:
+    """The same cache kept in a Redis-like client instead, so that every worker process sees the same entries and
+    invalidations. Values are stored as JSON, eviction is left to the server."""
+
+    def __init__(self, client, ttl, prefix='courier:'):
+        self.client, self.ttl, self.prefix = client, ttl, prefix
+        self.lock = threading.Lock()
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+    def get(self, key):
+        value = self.client.get(self.prefix + str(key))
+        with self.lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(value)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + str(key), json.dumps(value), px=int(self.ttl * 1000))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + str(key))
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': None}
+
+
+class FakeRedis:
+    """Dict-backed stand-in for the part of the redis.Redis interface SharedCache uses, for tests and single-process
+    runs without a Redis server."""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.data = dict()
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        with self.lock:
+            value, expires = self.data.get(name, (None, None))
+            if expires is not None and expires <= self.clock():
+                del self.data[name]
+                return None
+            return value
+
+    def set(self, name, value, px=None):
+        with self.lock:
+            self.data[name] = (value.encode() if isinstance(value, str) else value,
+                               None if px is None else self.clock() + px / 1000)
+        return True
+
+    def delete(self, *names):
+        with self.lock:
+            return sum(self.data.pop(name, None) is not None for name in names)
+
+
+def create_courier_cache():
+    """Redis cache when COURIER_CACHE_REDIS is set. Otherwise a cache of this process, which stays off with several
+    workers: the others change couriers without telling it, and its responses would be stale for up to the TTL."""
+    if COURIER_CACHE_REDIS:
+        import redis
+
+        return SharedCache(redis.Redis.from_url(COURIER_CACHE_REDIS), COURIER_CACHE_TTL)
+    return LocalCache(COURIER_CACHE_SIZE if WORKERS == 1 else 0, COURIER_CACHE_TTL)
+
+
+# Rendered GET /couriers/{courier_id} responses by courier_id
+courier_cache = create_courier_cache()
+
+
+def invalidate_courier(courier):
+    """Drops the cached response of courier once the session that changed it commits. A GET that read the courier
+    before that commit may still put the old response back, but only for COURIER_CACHE_TTL seconds."""
+    courier_id = courier.courier_id
+    on_commit(object_session(courier), lambda: courier_cache.delete(courier_id))
@@ -0,0 +1,170 @@
+import threading
+import time
+from collections import defaultdict
+
+from api.logic import MASK_BYTES, calculate_capacity
+from config import ASSIGN_EMPTY_TTL, WORKERS
+from data.courier import Courier
+from data.db_session import on_commit
+
+HOURS = (MASK_BYTES * 8 + 59) // 60
+HOUR_BITS = (1 << 60) - 1
+LOAD_CHUNK_SIZE = 5000
+
+
+def mask_hours(mask: bytes) -> list:
+    """Hours of the day a time_mask covers at least a minute of."""
+    mask = int.from_bytes(mask, 'little')
+    return [hour for hour in range(HOURS) if (mask >> hour * 60) & HOUR_BITS]
+
+
+class CourierIndex:
+    """Couriers by (region, hour of the working day), answering which couriers could carry an order without looking
+    at all the others. It is built from the database on first use and reloads the couriers that POST and PATCH
+    /couriers report changed.
+
+    It also remembers the couriers whose last POST /orders/assign found no orders for them, so that repeated calls
+    are answered without a scan until orders arrive in their regions or ttl seconds pass: dispatch.py runs in another
+    process and may free orders without telling."""
+
+    def __init__(self, ttl, enabled=True, clock=time.monotonic):
+        self.ttl, self.enabled, self.clock = ttl, enabled, clock
+        self.couriers = dict()
+        self.buckets = defaultdict(set)
+        self.built = False
+        self.dirty = set()
+        self.empty = dict()
+        self.version = 0
+        self.skipped_scans = 0
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+
+    def put(self, courier_id, regions, working_mask, courier_type):
+        with self.lock:
+            self._remove(courier_id)
+            hours = mask_hours(working_mask)
+            self.couriers[courier_id] = (set(regions), hours, int.from_bytes(working_mask, 'little'),
+                                         calculate_capacity(courier_type))
+            for region in set(regions):
+                for hour in hours:
+                    self.buckets[(region, hour)].add(courier_id)
+
+    def _remove(self, courier_id):
+        if courier_id not in self.couriers:
+            return
+        regions, hours, _, _ = self.couriers.pop(courier_id)
+        for region in regions:
+            for hour in hours:
+                self.buckets[(region, hour)].discard(courier_id)
+                if not self.buckets[(region, hour)]:
+                    del self.buckets[(region, hour)]
+
+    def refresh(self, session):
+        """Loads all the couriers on first use, afterwards only the ones changed since the last call."""
+        if not self.built:
+            with self.build_lock:
+                if not self.built:
+                    for row in session.query(Courier.courier_id, Courier.regions, Courier.working_mask,
+                                             Courier.courier_type).yield_per(LOAD_CHUNK_SIZE):
+                        self.put(*row)
+                    self.built = True
+        with self.lock:
+            courier_ids, self.dirty = self.dirty, set()
+        if courier_ids:
+            for row in session.query(Courier.courier_id, Courier.regions, Courier.working_mask,
+                                     Courier.courier_type).filter(Courier.courier_id.in_(courier_ids)):
+                self.put(*row)
+
+    def eligible(self, region, delivery_mask, weight) -> list:
+        """Ids of the couriers that work in region at some minute of delivery_mask and can lift weight."""
+        with self.lock:
+            return sorted(self._eligible(region, delivery_mask, weight))
+
+    def _eligible(self, region, delivery_mask, weight):
+        mask = int.from_bytes(delivery_mask, 'little')
+        candidates = set().union(*(self.buckets.get((region, hour), ()) for hour in mask_hours(delivery_mask)))
+        return [courier_id for courier_id in candidates
+                if self.couriers[courier_id][2] & mask and self.couriers[courier_id][3] >= weight]
+
+    def forget(self, courier_ids):
+        """The couriers changed, they are reloaded on the next refresh and scanned on their next assignment."""
+        with self.lock:
+            if self.built or self.build_lock.locked():
+                self.dirty.update(courier_ids)
+            self.version += 1
+            for courier_id in courier_ids:
+                self.empty.pop(courier_id, None)
+
+    def orders_added(self, regions):
+        """Free orders appeared in regions, couriers working there may find something now."""
+        with self.lock:
+            self.version += 1
+            if not self.built:
+                self.empty.clear()
+                return
+            for region in regions:
+                for hour in range(HOURS):
+                    for courier_id in self.buckets.get((region, hour), ()):
+                        self.empty.pop(courier_id, None)
+
+    def orders_released(self, orders):
+        """(region, delivery_mask, weight) orders were taken off a courier, the couriers that could deliver them may
+        find something now."""
+        with self.lock:
+            self.version += 1
+            if not self.built:
+                self.empty.clear()
+                return
+            for region, delivery_mask, weight in orders:
+                for courier_id in self._eligible(region, delivery_mask, weight):
+                    self.empty.pop(courier_id, None)
+
+    def current_version(self):
+        with self.lock:
+            return self.version
+
+    def mark_empty(self, courier_id, version):
+        """Remembers that an assignment scan started at version found nothing, unless orders appeared since."""
+        if not self.enabled:
+            return
+        with self.lock:
+            if self.version == version:
+                self.empty[courier_id] = self.clock() + self.ttl
+
+    def is_empty(self, courier_id) -> bool:
+        if not self.enabled:
+            return False
+        with self.lock:
+            expires = self.empty.get(courier_id)
+            if expires is None:
+                return False
+            if expires <= self.clock():
+                del self.empty[courier_id]
+                return False
+            self.skipped_scans += 1
+            return True
+
+    def stats(self):
+        return {'couriers': len(self.couriers), 'empty': len(self.empty), 'skipped_scans': self.skipped_scans}
+
+
+# Other worker processes neither see this one's index nor tell it about new orders, so with several of them it is
+# only used for GET /orders/{order_id}/couriers and is rebuilt for every request
+courier_index = CourierIndex(ASSIGN_EMPTY_TTL, enabled=WORKERS == 1)
+
+
+def invalidate_couriers(session, courier_ids):
+    courier_ids = list(courier_ids)
+    on_commit(session, lambda: courier_index.forget(courier_ids))
+
+
+def offer_orders(session, orders):
+    """Tells the index that (region, delivery_mask, weight) orders were released once the session commits."""
+    if orders:
+        on_commit(session, lambda: courier_index.orders_released(orders))
+
+
+def notify_orders(session, regions):
+    """Tells the index that orders in regions became free once the session commits."""
+    regions = set(regions)
+    on_commit(session, lambda: courier_index.orders_added(regions))
@@ -0,0 +1,108 @@
+import ijson
+from flask import request
+from flask_restful import abort
+from sqlalchemy import bindparam, select
+from sqlalchemy.exc import IntegrityError
+
+from config import STREAMING_THRESHOLD
+
+CHUNK_SIZE = 5000
+
+
+def existing_ids(session, key, ids) -> set:
+    query = select([key]).where(key.in_(bindparam('ids', expanding=True)))
+    return {row[0] for row in session.execute(query, {'ids': ids})}
+
+
+def ingest(session, model, items, validate, to_row, duplicate_error, taken=()):
+    """Validates items and inserts the valid ones into the model table CHUNK_SIZE rows at a time.
+
+    validate returns the list of errors of one item and to_row turns a valid item into a table row. Returns the ids of
+    inserted items and the {'id': ..., 'errors': [...]} reports of rejected ones in the order of items; once anything
+    is rejected nothing else is inserted and the caller is expected to roll the transaction back. Ids found in the
+    columns of taken, e.g. of an archive table, are rejected as duplicates too."""
+    key = next(iter(model.__table__.primary_key.columns))
+    seen = set()
+    successful = list()
+    unsuccessful = list()
+    chunk = list()
+
+    def reject(position, row, errors):
+        unsuccessful.append((position, {'id': row[key.name], 'errors': errors}))
+
+    def flush():
+        ids = [row[key.name] for _, row in chunk]
+        existing = existing_ids(session, key, ids).union(*(existing_ids(session, column, ids) for column in taken))
+        rows = list()
+        for position, row in chunk:
+            if row[key.name] in existing:
+                reject(position, row, [duplicate_error])
+            else:
+                rows.append((position, row))
+        if len(unsuccessful) == 0 and len(rows) > 0:
+            try:
+                session.execute(model.__table__.insert(), [row for _, row in rows])
+                successful.extend({'id': row[key.name]} for _, row in rows)
+            except IntegrityError:
+                session.rollback()
+                existing = existing_ids(session, key, [row[key.name] for _, row in rows])
+                for position, row in rows:
+                    if row[key.name] in existing:
+                        reject(position, row, [duplicate_error])
+                if len(unsuccessful) == 0:
+                    raise
+        chunk.clear()
+
+    for position, item in enumerate(items):
+        errors = validate(item)
+        if len(errors) == 0 and item[key.name] in seen:
+            errors.append(duplicate_error)
+        if len(errors) > 0:
+            reject(position, item, errors)
+            continue
+        seen.add(item[key.name])
+        chunk.append((position, to_row(item)))
+        if len(chunk) >= CHUNK_SIZE:
+            flush()
+    if len(chunk) > 0:
+        flush()
+    return successful, [report for _, report in sorted(unsuccessful, key=lambda rejected: rejected[0])]
+
+
+class StreamedItems:
+    """Items of the key array of a JSON document, parsed incrementally from stream."""
+
+    def __init__(self, stream, key):
+        self.stream = stream
+        self.key = key
+        self.found = False
+
+    def events(self):
+        for event in ijson.parse(self.stream, use_float=True):
+            if event[0] == self.key and event[1] == 'start_array':
+                self.found = True
+            yield event
+
+    def __iter__(self):
+        return ijson.items(self.events(), self.key + '.item')
+
+
+def ingest_request(session, model, validate, to_row, duplicate_error, taken=()):
+    """Runs ingest over the items of the request's data array. Bodies larger than STREAMING_THRESHOLD are validated
+    and inserted as they are parsed, so memory is bounded by one chunk instead of the whole payload."""
+    if request.content_length is not None and request.content_length <= STREAMING_THRESHOLD:
+        try:
+            return ingest(session, model, request.json['data'], validate, to_row, duplicate_error, taken)
+        except KeyError:
+            abort(400)
+
+    items = StreamedItems(request.stream, 'data')
+    try:
+        result = ingest(session, model, items, validate, to_row, duplicate_error, taken)
+    except (KeyError, ijson.JSONError):
+        session.rollback()
+        abort(400)
+    if not items.found:
+        session.rollback()
+        abort(400)
+    return result
@@ -1,4 +1,28 @@
 import datetime
+import math
+import re
+import time
+from functools import lru_cache
+from itertools import chain, compress, islice
+
+import numpy as np
+from sqlalchemy.orm import object_session
+
+from api.cache import invalidate_courier
+from config import DISPATCH_STAGE_TTL
+from data.courier_type_day_stats import CourierTypeDayStats
+from data.courier_type_hour_stats import CourierTypeHourStats
+from data.db_session import increment
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MILLISECOND = datetime.timedelta(milliseconds=1)
+HOUR_MS = 60 * 60 * 1000
+DAY_MS = 24 * HOUR_MS
+RFC3339 = re.compile(r'(\d{4}-\d\d-\d\d)[Tt](\d\d):(\d\d):(\d\d)(?:\.(\d+))?(?:[Zz]|([+-])(\d\d):(\d\d))\Z')
+MASK_BYTES = 192  # 1536 bits, enough for any minute up to "24:60"
+MASK_WORDS = MASK_BYTES // 8
+WEIGHT_UNITS = 100  # knapsack packing works in 0.01 kg steps
+PACKING_STRATEGIES = ('greedy', 'knapsack')
 
 
 def time_to_minutes(time):
@@ -24,18 +48,107 @@ def check_time(time1, time2):
     return False
 
 
-def format_date(date: datetime.datetime):
-    return date.isoformat('T')[:-4] + 'Z'
+def time_mask(time_intervals) -> bytes:
+    """Packs "HH:MM-HH:MM" intervals into a bitmap with one bit per minute, so that two schedules overlap if and
+    only if their masks have a common bit. Intervals that do not end after they start cover no minutes."""
+    mask = 0
+    for time_interval in time_intervals:
+        start, end = time_interval.split('-')
+        start, end = time_to_minutes(start), time_to_minutes(end)
+        if start < end:
+            mask |= (1 << end) - (1 << start)
+    return mask.to_bytes(MASK_BYTES, 'little')
+
+
+def check_masks(mask: bytes, masks) -> np.ndarray:
+    """Matches one mask against N masks at once and returns N booleans, True where the masks share a bit."""
+    if len(masks) == 0:
+        return np.zeros(0, dtype=bool)
+    words = np.frombuffer(mask, dtype='<u8')
+    table = np.frombuffer(b''.join(masks), dtype='<u8').reshape(-1, MASK_WORDS)
+    return (table & words).any(axis=1)
+
+
+def check_time_batch(time1, times2) -> np.ndarray:
+    """Vectorized check_time: matches one list of intervals against N lists of intervals."""
+    return check_masks(time_mask(time1), [time_mask(time2) for time2 in times2])
+
+
+def matching_orders(mask: bytes, orders, chunk_size: int):
+    """Yields the orders whose delivery_mask overlaps mask, checking them chunk_size orders at a time."""
+    orders = iter(orders)
+    while True:
+        chunk = list(islice(orders, chunk_size))
+        if len(chunk) == 0:
+            return
+        yield from compress(chunk, check_masks(mask, [order.delivery_mask for order in chunk]))
+
+
+def current_time() -> int:
+    """Now in epoch milliseconds, cut to the hundredths of a second format_date shows."""
+    return time.time_ns() // 10_000_000 * 10
+
+
+@lru_cache(maxsize=1024)
+def format_day(days: int) -> str:
+    return (EPOCH.date() + datetime.timedelta(days=days)).isoformat()
+
+
+def format_date(date: int) -> str:
+    """Formats epoch milliseconds the way the API shows them, e.g. 2021-01-10T10:33:01.42Z."""
+    days, date = divmod(date, DAY_MS)
+    return '%sT%02d:%02d:%02d.%02dZ' % (format_day(days), date // 3600000, date // 60000 % 60, date // 1000 % 60,
+                                        date // 10 % 100)
+
+
+def parse_date(date: str) -> int:
+    """Epoch milliseconds of an RFC 3339 timestamp such as 2021-01-10T10:33:01.42Z, ValueError for anything else."""
+    if not isinstance(date, str):
+        raise ValueError(f'Not a timestamp: {date!r}')
+    try:
+        moment = datetime.datetime.fromisoformat(date)
+    except ValueError:
+        # Pythons before 3.11 know neither "Z" nor fractions of other than 3 or 6 digits
+        moment = parse_rfc3339(date)
+    if moment.tzinfo is None:
+        raise ValueError(f'No time zone in {date!r}')
+    return (moment - EPOCH) // MILLISECOND
 
 
-def calculate_time(time1: str, time2: str) -> int:
-    time1 = datetime.datetime.fromisoformat(time1[:-4])
-    time2 = datetime.datetime.fromisoformat(time2[:-4])
-    time = time2 - time1
-    return time.seconds
+def parse_rfc3339(date: str) -> datetime.datetime:
+    match = RFC3339.match(date)
+    if match is None:
+        raise ValueError(f'Not an RFC 3339 timestamp: {date!r}')
+    day, hour, minute, second, fraction, sign, offset_hours, offset_minutes = match.groups()
+    zone = datetime.timezone.utc
+    if sign is not None:
+        offset = datetime.timedelta(hours=int(offset_hours), minutes=int(offset_minutes))
+        zone = datetime.timezone(offset if sign == '+' else -offset)
+    return datetime.datetime.combine(
+        datetime.date.fromisoformat(day),
+        datetime.time(int(hour), int(minute), int(second), int((fraction or '0')[:6].ljust(6, '0')), zone))
+
+
+def calculate_time(time1: int, time2: int) -> int:
+    """Whole seconds from time1 to time2, both in epoch milliseconds. Completions reported as earlier than the last
+    action take no time."""
+    return max(0, (time2 - time1) // 1000)
+
+
+def stage_expiry(now: int) -> int:
+    """staged_time at or before which a dispatch.py plan no longer keeps an order from other couriers."""
+    return now - int(DISPATCH_STAGE_TTL * 1000)
 
 
 def validate_time_interval(time_interval):
+    if not isinstance(time_interval, str):
+        return 'Wrong time interval format. Correct usage: "HH:MM-HH:MM"'
+    return validate_time_interval_string(time_interval)
+
+
+@lru_cache(maxsize=4096)
+def validate_time_interval_string(time_interval):
+    """Payloads reuse a handful of distinct intervals, so results are cached instead of splitting them every time."""
     if len(time_interval) != 11:
         return 'Wrong time interval format. Correct usage: "HH:MM-HH:MM"'
     try:
@@ -53,8 +166,97 @@ def calculate_capacity(courier_type):
     return capacity_table[courier_type]
 
 
-def end_session_for_courier(courier):
+def weight_to_units(weight: float) -> int:
+    return math.ceil(round(weight * WEIGHT_UNITS, 6))
+
+
+def pack_orders(orders, capacity, strategy='greedy', time_budget=0.05) -> list:
+    """Picks orders for one delivery out of orders sorted by ascending weight.
+
+    'greedy' takes the lightest orders while they fit, which maximizes the number of orders. 'knapsack' solves 0/1
+    knapsack over weights rounded up to 0.01 kg and maximizes the loaded weight; orders it had no time_budget left for
+    are then added greedily. Both return the picked orders in ascending weight order."""
+    if strategy == 'greedy':
+        packed = list()
+        for order in orders:
+            if capacity - order.weight < 0:
+                break
+            packed.append(order)
+            capacity -= order.weight
+        return packed
+    if strategy != 'knapsack':
+        raise ValueError(f'Unknown packing strategy: {strategy}')
+
+    # Rounded like weight_to_units, a capacity left after a partly lost claim, 10 - 0.3, is 969.9999999999999 units
+    limit = math.floor(round(capacity * WEIGHT_UNITS, 6))
+    deadline = time.perf_counter() + time_budget
+
+    # Bit w of reachable is set when some subset of the orders seen so far weighs exactly w units,
+    # history[i] keeps that set as it was before order i. Orders are read only as far as the knapsack gets, so that
+    # a streamed candidates query is not drained.
+    reachable, everything = 1, (1 << (limit + 1)) - 1
+    seen, units, history = list(), list(), list()
+    orders = iter(orders)
+    pending = None
+    for order in orders:
+        weight = weight_to_units(order.weight)
+        if weight > limit:
+            # Orders only get heavier, none of the rest fits either
+            break
+        if time.perf_counter() > deadline or (reachable >> limit) & 1:
+            # Out of time, or the bag can be filled exactly and nothing can do better
+            pending = (order, weight)
+            break
+        seen.append(order)
+        units.append(weight)
+        history.append(reachable)
+        reachable = (reachable | (reachable << weight)) & everything
+
+    best = reachable.bit_length() - 1
+    picked = list()
+    for i in reversed(range(len(history))):
+        if not (history[i] >> best) & 1:
+            picked.append(i)
+            best -= units[i]
+    picked.reverse()
+    packed = [seen[i] for i in picked]
+    if pending is None:
+        return packed
+
+    # The rest is added greedily, up to the first order that does not fit
+    remaining = limit - sum(units[i] for i in picked)
+    for order, weight in chain([pending], ((order, weight_to_units(order.weight)) for order in orders)):
+        if weight > remaining:
+            break
+        packed.append(order)
+        remaining -= weight
+    return packed
+
+
+def keep_orders(orders, regions, working_mask: bytes, capacity, time_budget=0.05) -> list:
+    """Picks the orders a courier keeps after its type, regions or hours changed, out of orders sorted by ascending
+    weight. Orders it cannot deliver anymore are dropped first, then, if the rest no longer fits, the heaviest subset
+    that does is kept, so that no more orders are given up than necessary."""
+    regions = set(regions)
+    matches = check_masks(working_mask, [order.delivery_mask for order in orders])
+    orders = [order for order, match in zip(orders, matches) if match and order.region in regions]
+    if sum(order.weight for order in orders) <= capacity:
+        return orders
+    return pack_orders(orders, capacity, 'knapsack', time_budget)
+
+
+def end_session_for_courier(courier, end_time: int):
+    """Pays the courier for the delivery that ended at end_time, in epoch milliseconds, and frees it for the next."""
+    invalidate_courier(courier)
     payday_table = {'foot': 2, 'bike': 5, 'car': 9}
-    courier.earnings += 500 * payday_table[courier.courier_type_when_formed]
+    earnings = 500 * payday_table[courier.courier_type_when_formed]
+    courier.earnings += earnings
+    session = object_session(courier)
+    increment(session, CourierTypeHourStats,
+              {'courier_type': courier.courier_type_when_formed, 'hour': end_time // HOUR_MS},
+              {'deliveries': 1, 'earnings': earnings})
+    increment(session, CourierTypeDayStats,
+              {'courier_type': courier.courier_type_when_formed, 'day': end_time // DAY_MS},
+              {'deliveries': 1, 'earnings': earnings})
     courier.assign_time = None
     courier.courier_type_when_formed = None
@@ -0,0 +1,18 @@
+from flask import request
+from flask_restful import Resource
+
+from api.cache import courier_cache
+from api.eligibility import courier_index
+from api.pool import order_pool
+from data.db_session import create_session, open_sessions
+
+
+class MetricsResource(Resource):
+    """/metrics"""
+
+    def get(self):
+        sessions, pool = open_sessions(), order_pool.stats()
+        if order_pool.built and request.args.get('check_pool'):
+            pool.update(order_pool.check(create_session()))
+        return {'open_sessions': sessions, 'courier_cache': courier_cache.stats(),
+                'courier_index': courier_index.stats(), 'order_pool': pool}, 200
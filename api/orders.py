@@ -1,14 +1,31 @@
-from datetime import datetime
+import heapq
+from collections import defaultdict
+from operator import attrgetter
 
+import sqlalchemy as sa
 from flask import request
 from flask_restful import abort, Resource
 
-from api.logic import check_time, format_date, calculate_time, validate_time_interval, calculate_capacity, \
-    end_session_for_courier
+from api.analytics import record_completion
+from api.cache import invalidate_courier
+from api.eligibility import CourierIndex, courier_index, notify_orders
+from api.pool import order_pool, pool_orders, unpool_orders
+from api.ingestion import ingest_request
+from api.logic import current_time, format_date, parse_date, calculate_time, calculate_capacity, \
+    end_session_for_courier, time_mask, matching_orders, pack_orders, stage_expiry
+from api.schemas import validate_order
+from config import PACKING_STRATEGY, PACKING_TIME_BUDGET
 from data.courier import Courier
+from data.courier_region_stats import CourierRegionStats
 from data.order import Order
+from data.order_archive import OrderArchive
 from data.db_session import create_session
 
+CANDIDATES_CHUNK_SIZE = 500
+# Bulk assignment checks time windows of the in-memory pool in smaller chunks, one delivery needs only a few orders
+POOL_CHUNK_SIZE = 64
+CLAIMS_CHUNK_SIZE = 5000
+
 
 class OrdersAssignment(Resource):
     """/orders/assign"""
@@ -23,103 +40,323 @@ class OrdersAssignment(Resource):
         if courier is None:
             abort(400)
 
-        orders = list()
-
         if courier.assign_time is not None:
-            for order in courier.orders:
-                if order.complete_time is None:
-                    orders.append({'id': order.order_id})
+            orders = current_delivery(session, courier)
             if len(orders) == 0:
-                end_session_for_courier(courier)
+                end_session_for_courier(courier, current_time())
                 session.commit()
             else:
-                return {'orders': orders, 'assign_time': courier.assign_time}, 200
+                return {'orders': orders, 'assign_time': format_date(courier.assign_time)}, 200
 
-        capacity = calculate_capacity(courier.courier_type)
+        if courier_index.is_empty(courier.courier_id):
+            # Nothing has been found for the courier a moment ago and no orders have appeared in its regions since
+            return {'orders': []}, 200
+        version = courier_index.current_version()
 
-        for order in session.query(Order).filter((Order.courier_id == None) | (Order.courier_id == courier.courier_id)) \
-                .order_by(Order.weight).filter(Order.complete_time == None).all():
-            if capacity - order.weight < 0:
-                break
-            if check_time(courier.working_hours, order.delivery_hours) and order.region in courier.regions:
-                orders.append({'id': order.order_id})
-                order.courier_id = courier.courier_id
-                capacity -= order.weight
+        assign_time = current_time()
+        if not claim_courier(session, courier, assign_time):
+            # Another request has just formed a delivery for this courier, answer with it
+            session.rollback()
+            return {'orders': current_delivery(session, courier), 'assign_time': format_date(courier.assign_time)}, 200
 
+        orders = [{'id': order_id} for order_id in assign_orders(session, courier)]
         if len(orders) == 0:
+            session.rollback()
+            if courier_index.enabled:
+                courier_index.refresh(session)
+                courier_index.mark_empty(courier.courier_id, version)
             return {'orders': orders}, 200
 
-        courier.assign_time = format_date(datetime.utcnow())
-        courier.last_action_time = courier.assign_time
+        courier.assign_time = assign_time
+        courier.last_action_time = assign_time
         courier.courier_type_when_formed = courier.courier_type
         session.commit()
-        return {'orders': orders, 'assign_time': courier.assign_time}, 200
+        return {'orders': orders, 'assign_time': format_date(courier.assign_time)}, 200
 
 
-class OrdersListResource(Resource):
-    """/orders"""
+class OrdersBulkAssignment(Resource):
+    """/orders/assign/bulk"""
 
     def post(self):
         try:
-            args = request.json['data']
-        except KeyError:
+            courier_ids = request.json['courier_ids']
+        except (KeyError, TypeError):
+            abort(400)
+        if not isinstance(courier_ids, list):
             abort(400)
         session = create_session()
-        successful = list()
-        unsuccessful = list()
-        for dataset in args:
-
-            errors = list()
-
-            if not isinstance(dataset['order_id'], int) or dataset['order_id'] < 1:
-                errors.append('Order ID must be positive integer.')
-
-            if 'weight' not in dataset:
-                errors.append('Weight must be specified.')
-            elif not (isinstance(dataset['weight'], float) or isinstance(dataset['weight'], int)):
-                errors.append('Weight must be float.')
-            elif dataset['weight'] < 0.01:
-                errors.append('The weight must be greater than or equal to 0.01.')
-            elif dataset['weight'] > 50:
-                errors.append('The weight must be less than or equal to 50.')
-
-            if 'region' not in dataset:
-                errors.append('Region must be specified.')
-            elif not isinstance(dataset['region'], int) or dataset['region'] < 0:
-                errors.append('Region must be positive integer.')
-
-            if 'delivery_hours' not in dataset:
-                errors.append('Delivery hours must be specified.')
-            elif not isinstance(dataset['delivery_hours'], list):
-                errors.append('Delivery hours must be an array.')
-            elif len(dataset['delivery_hours']) == 0:
-                errors.append('At least one delivery time slot is required.')
+        ids = list(dict.fromkeys(courier_id for courier_id in courier_ids if isinstance(courier_id, int)))
+        couriers = {courier.courier_id: courier
+                    for courier in session.query(Courier).filter(Courier.courier_id.in_(ids))} if ids else dict()
+
+        results, busy = dict(), [courier for courier in couriers.values() if courier.assign_time is not None]
+        if busy:
+            open_orders = defaultdict(list)
+            for order_id, courier_id in session.query(Order.order_id, Order.courier_id) \
+                    .filter(Order.courier_id.in_([courier.courier_id for courier in busy])) \
+                    .filter(Order.complete_time == None).order_by(Order.order_id):
+                open_orders[courier_id].append({'id': order_id})
+            for courier in busy:
+                if open_orders[courier.courier_id]:
+                    results[courier.courier_id] = {'orders': open_orders[courier.courier_id],
+                                                   'assign_time': format_date(courier.assign_time)}
+                else:
+                    end_session_for_courier(courier, current_time())
+            session.commit()
+
+        assign_time = current_time()
+        free, taken_over = claim_couriers(session, [couriers[courier_id] for courier_id in ids
+                                                    if courier_id in couriers and courier_id not in results],
+                                          assign_time)
+
+        deliveries = distribute_orders(session, free)
+        idle = [courier.courier_id for courier in free if len(deliveries[courier.courier_id]) == 0]
+        if idle:
+            session.query(Courier).filter(Courier.courier_id.in_(idle)) \
+                .update({Courier.assign_time: None}, synchronize_session=False)
+        for courier in free:
+            if deliveries[courier.courier_id]:
+                courier.assign_time = assign_time
+                courier.last_action_time = assign_time
+                courier.courier_type_when_formed = courier.courier_type
+                orders = [{'id': order_id} for order_id in deliveries[courier.courier_id]]
+                results[courier.courier_id] = {'orders': orders, 'assign_time': format_date(assign_time)}
             else:
-                for time_interval in dataset['delivery_hours']:
-                    result = validate_time_interval(time_interval)
-                    if result is not None:
-                        errors.append(result)
-
-            if len(errors) > 0:
-                unsuccessful.append({'id': dataset['order_id'], 'errors': errors})
-                continue
-
-            order = Order(
-                order_id=dataset['order_id'],
-                weight=float(dataset['weight']),
-                region=dataset['region'],
-                delivery_hours=dataset['delivery_hours']
-            )
-            session.add(order)
-            successful.append({'id': dataset['order_id']})
+                results[courier.courier_id] = {'orders': []}
+        session.commit()
+
+        for courier in taken_over:
+            # A concurrent request has just formed a delivery for this courier, answer with it
+            results[courier.courier_id] = {'orders': current_delivery(session, courier),
+                                           'assign_time': format_date(courier.assign_time)}
+        return {'couriers': [dict(courier_id=courier_id, status=200, **results[courier_id])
+                             if courier_id in results else {'courier_id': courier_id, 'status': 400}
+                             for courier_id in courier_ids]}, 200
+
+
+def distribute_orders(session, couriers):
+    """Packs and claims deliveries for several couriers, taking turns in the given order, from a single scan of the free
+    orders of all their regions. Returns the ids of the orders each courier got by courier_id."""
+    deliveries = {courier.courier_id: list() for courier in couriers}
+    if not couriers:
+        return deliveries
+
+    pool = defaultdict(list)
+    for order in session.query(Order.order_id, Order.weight, Order.region, Order.delivery_mask) \
+            .filter(Order.region.in_(set().union(*(courier.regions for courier in couriers)))) \
+            .filter(Order.courier_id == None).filter(Order.complete_time == None) \
+            .filter((Order.staged_courier_id == None) | Order.staged_courier_id.in_(list(deliveries))
+                    | (Order.staged_time <= stage_expiry(current_time()))) \
+            .filter(Order.weight <= max(calculate_capacity(courier.courier_type) for courier in couriers)) \
+            .order_by(Order.weight).yield_per(CANDIDATES_CHUNK_SIZE):
+        pool[order.region].append(order)
+
+    taken = set()
+    for courier in couriers:
+        regions = set(courier.regions)
+        candidates = (order for order in heapq.merge(*(pool[region] for region in regions), key=attrgetter('weight'))
+                      if order.order_id not in taken)
+        packed = pack_orders(matching_orders(courier.working_mask, candidates, POOL_CHUNK_SIZE),
+                             calculate_capacity(courier.courier_type), PACKING_STRATEGY, PACKING_TIME_BUDGET)
+        deliveries[courier.courier_id] = [order.order_id for order in packed]
+        taken.update(deliveries[courier.courier_id])
+        for region in regions:
+            # The lightest orders go first, so dropping the taken head keeps later couriers from skipping over it
+            orders, head = pool[region], 0
+            while head < len(orders) and orders[head].order_id in taken:
+                head += 1
+            del orders[:head]
+    deliveries = claim_deliveries(session, deliveries)
+    unpool_orders(session, [order_id for order_ids in deliveries.values() for order_id in order_ids])
+    return deliveries
+
+
+def not_staged_for_others(courier):
+    """Filter for the orders no other courier has a dispatch.py plan for that is still in force."""
+    # "staged for nobody or for us" spelled with coalesce, see claim_orders
+    return (sa.func.coalesce(Order.staged_courier_id, courier.courier_id) == courier.courier_id) \
+        | (Order.staged_time <= stage_expiry(current_time()))
+
+
+def claim_couriers(session, couriers, assign_time):
+    """claim_courier for several couriers, returns the claimed couriers and the ones a concurrent request got first.
+
+    The claimed rows are told by RETURNING on PostgreSQL and by the rowcount of an UPDATE per courier elsewhere, not by
+    assign_time: a concurrent request may claim its couriers with the same one."""
+    if not couriers:
+        return list(), list()
+    ids = [courier.courier_id for courier in couriers]
+    if session.get_bind().dialect.name == 'postgresql':
+        claimed = {courier_id for courier_id, in session.execute(
+            Courier.__table__.update().where(Courier.courier_id.in_(ids)).where(Courier.assign_time == None)
+            .values(assign_time=assign_time).returning(Courier.courier_id))}
+    else:
+        statement = Courier.__table__.update() \
+            .where(Courier.courier_id == sa.bindparam('courier')).where(Courier.assign_time == None) \
+            .values(assign_time=assign_time)
+        # Compiled once for all the couriers
+        connection = session.connection().execution_options(compiled_cache=dict())
+        claimed = {courier_id for courier_id in ids
+                   if connection.execute(statement, {'courier': courier_id}).rowcount == 1}
+    return [courier for courier in couriers if courier.courier_id in claimed], \
+           [courier for courier in couriers if courier.courier_id not in claimed]
+
+
+def claim_deliveries(session, deliveries):
+    """claim_orders for several couriers with one executemany, returns the ids of the orders each courier got."""
+    claims = [{'order': order_id, 'courier': courier_id}
+              for courier_id, order_ids in deliveries.items() for order_id in order_ids]
+    if not claims:
+        return deliveries
+    courier = sa.bindparam('courier')
+    statement = Order.__table__.update() \
+        .where(Order.order_id == sa.bindparam('order')).where(Order.complete_time == None) \
+        .where(sa.func.coalesce(Order.courier_id, courier) == courier).values(courier_id=courier)
+    if session.execute(statement, claims).rowcount == len(claims):
+        return deliveries
+
+    owners = dict()
+    for start in range(0, len(claims), CLAIMS_CHUNK_SIZE):
+        owners.update(session.query(Order.order_id, Order.courier_id).filter(
+            Order.order_id.in_([claim['order'] for claim in claims[start:start + CLAIMS_CHUNK_SIZE]])))
+    return {courier_id: [order_id for order_id in order_ids if owners[order_id] == courier_id]
+            for courier_id, order_ids in deliveries.items()}
+
+
+def current_delivery(session, courier):
+    """Orders the courier still has to deliver, read from the open orders index instead of its whole history."""
+    return [{'id': order_id} for order_id, in session.query(Order.order_id)
+            .filter(Order.courier_id == courier.courier_id, Order.complete_time == None).order_by(Order.order_id)]
+
+
+def has_open_orders(session, courier):
+    return session.query(sa.exists().where(Order.courier_id == courier.courier_id)
+                         .where(Order.complete_time == None)).scalar()
+
+
+def claim_courier(session, courier, assign_time):
+    """Marks the courier as busy unless a concurrent request already did, the loser gets False."""
+    return session.query(Courier) \
+        .filter(Courier.courier_id == courier.courier_id, Courier.assign_time == None) \
+        .update({Courier.assign_time: assign_time}, synchronize_session=False) == 1
+
+
+def assign_orders(session, courier):
+    """Packs free orders into the courier's bag and claims them, returns ids of the orders it got.
+
+    Orders dispatch.py staged for the courier come first, orders staged for other couriers are left to them until the
+    plan expires.
+    Orders taken by a concurrent request between the select and the claim are skipped and the freed capacity is packed
+    again. The claim waits for the winner's commit, so lost orders never come back as candidates and this ends."""
+    capacity = calculate_capacity(courier.courier_type)
+    staged = session.query(Order.order_id, Order.weight, Order.delivery_mask) \
+        .filter(Order.staged_courier_id == courier.courier_id, Order.courier_id == None) \
+        .filter(Order.complete_time == None, Order.region.in_(courier.regions), Order.weight <= capacity) \
+        .order_by(Order.weight).all()
+    if staged:
+        packed = pack_orders(matching_orders(courier.working_mask, staged, CANDIDATES_CHUNK_SIZE), capacity,
+                             PACKING_STRATEGY, PACKING_TIME_BUDGET)
+        claimed = claim_orders(session, courier, [order.order_id for order in packed]) if packed else set()
+        if claimed:
+            return [order.order_id for order in packed if order.order_id in claimed]
+
+    assigned, tried = list(), set()
+    while True:
+        if order_pool.built:
+            # The pool does not know what dispatch.py staged for others, claim_orders skips those and they are not
+            # tried again
+            candidates = (order for order in order_pool.candidates(courier.regions, capacity)
+                          if order.order_id not in tried)
+        else:
+            # A region at a time, so that each query walks the region's free orders in the index by weight instead of
+            # sorting them all before the first row. The courier has no open orders of its own here, claim_courier
+            # made sure of it, and the ones claimed by the previous rounds are not free anymore
+            candidates = heapq.merge(*(session.query(Order.order_id, Order.weight, Order.delivery_mask)
+                                       .filter(Order.region == region, Order.courier_id == None)
+                                       .filter(Order.complete_time == None, Order.weight <= capacity)
+                                       .filter(not_staged_for_others(courier))
+                                       .order_by(Order.weight).yield_per(CANDIDATES_CHUNK_SIZE)
+                                       for region in set(courier.regions)), key=attrgetter('weight'))
+
+        packed = pack_orders(matching_orders(courier.working_mask, candidates, CANDIDATES_CHUNK_SIZE), capacity,
+                             PACKING_STRATEGY, PACKING_TIME_BUDGET)
+        if len(packed) == 0:
+            return assigned
+        claimed = claim_orders(session, courier, [order.order_id for order in packed])
+        tried.update(order.order_id for order in packed)
+        assigned.extend(order.order_id for order in packed if order.order_id in claimed)
+        capacity -= sum(order.weight for order in packed if order.order_id in claimed)
+        if len(claimed) == len(packed):
+            return assigned
+
+
+def claim_orders(session, courier, order_ids):
+    """Assigns the orders that are still free to the courier with one conditional UPDATE, returns the claimed ids."""
+    # "courier_id is null or ours" spelled with coalesce, so that SQLite looks the orders up by primary key instead of
+    # walking every free order in the courier_id index
+    claimed = session.query(Order) \
+        .filter(Order.order_id.in_(order_ids), Order.complete_time == None) \
+        .filter(sa.func.coalesce(Order.courier_id, courier.courier_id) == courier.courier_id) \
+        .filter(not_staged_for_others(courier)) \
+        .update({Order.courier_id: courier.courier_id}, synchronize_session=False)
+    if claimed == len(order_ids):
+        claimed = set(order_ids)
+    else:
+        claimed = {order_id for order_id, in session.query(Order.order_id)
+                   .filter(Order.order_id.in_(order_ids), Order.courier_id == courier.courier_id)}
+    unpool_orders(session, claimed)
+    return claimed
+
+
+class OrdersListResource(Resource):
+    """/orders"""
+
+    def post(self):
+        session = create_session()
+        regions, pooled = set(), list()
+
+        def to_row(dataset):
+            row = order_row(dataset)
+            regions.add(row['region'])
+            if order_pool.built:
+                pooled.append((row['order_id'], row['weight'], row['region'], row['delivery_mask']))
+            return row
+
+        successful, unsuccessful = ingest_request(session, Order, validate_order, to_row, 'Order ID must be unique.',
+                                                  taken=[OrderArchive.order_id])
 
         if len(unsuccessful) > 0:
+            session.rollback()
             return {'validation_error': {'orders': unsuccessful}}, 400
         else:
+            notify_orders(session, regions)
+            pool_orders(session, pooled)
             session.commit()
             return {'orders': successful}, 201
 
 
+def order_row(dataset):
+    return {'order_id': dataset['order_id'],
+            'weight': float(dataset['weight']),
+            'region': dataset['region'],
+            'delivery_hours': dataset['delivery_hours'],
+            'delivery_mask': time_mask(dataset['delivery_hours'])}
+
+
+class OrderCouriers(Resource):
+    """/orders/{order_id}/couriers"""
+
+    def get(self, order_id):
+        session = create_session()
+        order = session.query(Order).filter(Order.order_id == order_id).scalar()
+        if order is None:
+            abort(404)
+
+        index = courier_index if courier_index.enabled else CourierIndex(0)
+        index.refresh(session)
+        return {'order_id': order_id, 'couriers': index.eligible(order.region, order.delivery_mask, order.weight)}, 200
+
+
 class OrdersCompletion(Resource):
     """/orders/complete"""
 
@@ -128,31 +365,104 @@ class OrdersCompletion(Resource):
         try:
             order_id = request.json['order_id']
             courier_id = request.json['courier_id']
-            complete_time = request.json['complete_time']
-        except KeyError:
+            complete_time = parse_date(request.json['complete_time'])
+        except (KeyError, ValueError):
             abort(400)
         session = create_session()
         order = session.query(Order).filter(Order.order_id == order_id).scalar()
+        if order is None and archived_couriers(session, [order_id]).get(order_id) == courier_id:
+            # Completed long ago and moved to the archive, completing it again changes nothing
+            return {'order_id': order_id}, 200
         if order is None or order.courier_id != courier_id:
             abort(400)
 
-        courier = order.courier
+        complete_order(session, order, complete_time)
+        session.commit()
+        return {'order_id': order_id}, 200
+
 
-        if str(order.region) not in courier.delivery_time_for_regions.keys():
-            courier.delivery_time_for_regions[order.region] = list()
-            courier.delivery_time_for_regions[order.region].append(1)
-            courier.delivery_time_for_regions[order.region].append(
-                calculate_time(courier.last_action_time, complete_time))
-        else:
-            courier.delivery_time_for_regions[str(order.region)][0] += 1
-            courier.delivery_time_for_regions[str(order.region)][1] += calculate_time(courier.last_action_time,
-                                                                                      complete_time)
+class OrdersBulkCompletion(Resource):
+    """/orders/complete/bulk"""
+
+    def post(self):
+        try:
+            items = request.json['data']
+        except (KeyError, TypeError):
+            abort(400)
+        if not isinstance(items, list):
+            abort(400)
+        session = create_session()
+
+        ids = {item['order_id'] for item in items if isinstance(item, dict) and isinstance(item.get('order_id'), int)}
+        orders = {order.order_id: order for order in session.query(Order).filter(Order.order_id.in_(ids))} \
+            if ids else dict()
+        archived = archived_couriers(session, ids - orders.keys())
 
-        courier.last_action_time = complete_time
-        order.complete_time = complete_time
+        statuses, accepted = [400] * len(items), list()
+        for i, item in enumerate(items):
+            try:
+                order = orders.get(item['order_id'])
+                if order is not None and order.courier_id == item['courier_id']:
+                    accepted.append((item['courier_id'], parse_date(item['complete_time']), i))
+                elif order is None and archived.get(item['order_id']) == item['courier_id']:
+                    statuses[i] = 200
+            except (KeyError, TypeError, ValueError):
+                pass
 
-        if len([True for order in courier.orders if order.complete_time is None]) == 0:
-            end_session_for_courier(courier)
+        # A courier's completions are applied in the order they happened, whatever order the app sent them in
+        for _, complete_time, i in sorted(accepted):
+            complete_order(session, orders[items[i]['order_id']], complete_time)
+            statuses[i] = 200
 
         session.commit()
-        return {'order_id': order_id}, 200
+        return {'orders': [{'order_id': item.get('order_id') if isinstance(item, dict) else None, 'status': status}
+                           for item, status in zip(items, statuses)]}, 200
+
+
+def archived_couriers(session, order_ids) -> dict:
+    """Couriers of the archived orders among order_ids by order_id."""
+    if not order_ids:
+        return dict()
+    return dict(session.query(OrderArchive.order_id, OrderArchive.courier_id)
+                .filter(OrderArchive.order_id.in_(order_ids)))
+
+
+def complete_order(session, order, complete_time: int):
+    """Completes order by its courier at complete_time, in epoch milliseconds: records the delivery time for the rating
+    and the analytics, moves the courier's last action time and ends the delivery when this was its last open order.
+    Completing a completed order changes nothing."""
+    if order.complete_time is not None:
+        return
+    courier = order.courier
+    invalidate_courier(courier)
+    seconds = calculate_time(courier.last_action_time, complete_time)
+    record_delivery(session, courier, order.region, seconds)
+    record_completion(session, order.region, courier.courier_type_when_formed, complete_time, seconds)
+    courier.last_action_time = complete_time
+    order.complete_time = complete_time
+
+    if not has_open_orders(session, courier):
+        end_session_for_courier(courier, complete_time)
+
+
+def record_delivery(session, courier, region, seconds):
+    """Adds a delivery that took seconds to the courier's stats for region with a single-row increment and keeps
+    courier.min_average_time, the lowest average delivery time over regions, up to date for the rating."""
+    stats = session.query(CourierRegionStats) \
+        .filter(CourierRegionStats.courier_id == courier.courier_id, CourierRegionStats.region == region).scalar()
+    if stats is None:
+        session.add(CourierRegionStats(courier_id=courier.courier_id, region=region, count=1, total=seconds))
+        previous, average = None, seconds
+    else:
+        previous, average = stats.total / stats.count, (stats.total + seconds) / (stats.count + 1)
+        stats.count = CourierRegionStats.count + 1
+        stats.total = CourierRegionStats.total + seconds
+
+    if courier.min_average_time is None or average <= courier.min_average_time:
+        courier.min_average_time = average
+    elif previous == courier.min_average_time:
+        # The region that had the lowest average got slower, another one may be the fastest now
+        session.flush()
+        courier.min_average_time = session.query(
+            sa.func.min(sa.cast(CourierRegionStats.total, sa.Float) / CourierRegionStats.count)) \
+            .filter(CourierRegionStats.courier_id == courier.courier_id).scalar()
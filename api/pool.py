@@ -0,0 +1,103 @@
+import bisect
+import heapq
+import threading
+from collections import defaultdict, namedtuple
+from typing import Iterator
+
+from config import ORDER_POOL, WORKERS
+from data.db_session import create_session, on_commit, remove_session
+from data.order import Order
+
+PooledOrder = namedtuple('PooledOrder', 'weight order_id delivery_mask')
+LOAD_CHUNK_SIZE = 5000
+
+
+class OrderPool:
+    """Free open orders kept in memory as per-region lists sorted by weight, so that POST /orders/assign picks its
+    candidates without sorting them in the database. The database stays the source of truth: claims are still made
+    with its conditional UPDATE, the pool is only told about committed changes and can be checked against it."""
+
+    def __init__(self):
+        self.regions = defaultdict(list)
+        self.orders = dict()
+        self.built = False
+        self.lock = threading.Lock()
+
+    def build(self, session):
+        """Loads the free orders. Must run before requests are served, changes committed meanwhile would be missed."""
+        with self.lock:
+            self.regions.clear()
+            self.orders.clear()
+            for order_id, weight, region, delivery_mask in session.query(
+                    Order.order_id, Order.weight, Order.region, Order.delivery_mask) \
+                    .filter(Order.courier_id == None, Order.complete_time == None) \
+                    .order_by(Order.weight, Order.order_id).yield_per(LOAD_CHUNK_SIZE):
+                self.regions[region].append(PooledOrder(weight, order_id, delivery_mask))
+                self.orders[order_id] = (region, weight)
+            self.built = True
+
+    def add(self, orders):
+        """Puts (order_id, weight, region, delivery_mask) orders into the pool, ones already there are skipped."""
+        with self.lock:
+            for order_id, weight, region, delivery_mask in orders:
+                if order_id not in self.orders:
+                    bisect.insort(self.regions[region], PooledOrder(weight, order_id, delivery_mask))
+                    self.orders[order_id] = (region, weight)
+
+    def remove(self, order_ids):
+        with self.lock:
+            for order_id in order_ids:
+                if order_id not in self.orders:
+                    continue
+                region, weight = self.orders.pop(order_id)
+                orders = self.regions[region]
+                i = bisect.bisect_left(orders, (weight, order_id))
+                if i < len(orders) and orders[i].order_id == order_id:
+                    del orders[i]
+
+    def candidates(self, regions, capacity) -> Iterator[PooledOrder]:
+        """Orders of regions no heavier than capacity by ascending weight. The regions' lists are copied so that they
+        can be iterated while other requests change the pool, but merged lazily, packing reads only the lightest."""
+        with self.lock:
+            heads = [orders[:bisect.bisect_right(orders, (capacity, float('inf')))]
+                     for orders in (self.regions.get(region, ()) for region in set(regions))]
+        return heapq.merge(*heads)
+
+    def check(self, session) -> dict:
+        """Compares the pool with the free orders in the database: 'missing' orders are free but not in the pool,
+        'extra' ones are in the pool but not free. Orders changed by requests running meanwhile may show up too."""
+        free = {order_id for order_id, in session.query(Order.order_id)
+                .filter(Order.courier_id == None, Order.complete_time == None).yield_per(LOAD_CHUNK_SIZE)}
+        with self.lock:
+            pooled = set(self.orders)
+        return {'missing': len(free - pooled), 'extra': len(pooled - free)}
+
+    def stats(self):
+        return {'enabled': self.built, 'size': len(self.orders)}
+
+
+order_pool = OrderPool()
+
+
+def build_order_pool():
+    """Builds the pool at startup when it is turned on. Other processes would change orders without telling this
+    one's pool, so with several workers it stays off."""
+    if not ORDER_POOL or WORKERS > 1:
+        return
+    try:
+        order_pool.build(create_session())
+    finally:
+        remove_session()
+
+
+def pool_orders(session, orders):
+    """Puts (order_id, weight, region, delivery_mask) orders into the pool once the session commits."""
+    if order_pool.built and orders:
+        on_commit(session, lambda: order_pool.add(orders))
+
+
+def unpool_orders(session, order_ids):
+    """Takes the orders out of the pool once the session commits."""
+    if order_pool.built and order_ids:
+        order_ids = list(order_ids)
+        on_commit(session, lambda: order_pool.remove(order_ids))
@@ -0,0 +1,100 @@
+"""Declarative schemas of courier and order payloads, composed once into validator functions."""
+from api.logic import validate_time_interval
+
+
+class Check:
+    """Fails a field with message when condition, a predicate over the field's value, is true."""
+
+    def __init__(self, condition, message):
+        self.condition = condition
+        self.message = message
+
+
+class Field:
+    """A payload field: checks run in order and only the first failing one is reported. missing is the error for an
+    absent field (None makes the field mandatory without a message, like IDs), and intervals additionally validates
+    every "HH:MM-HH:MM" string of a value that passed all checks."""
+
+    def __init__(self, name, *checks, missing=None, intervals=False):
+        self.name = name
+        self.checks = checks
+        self.missing = missing
+        self.intervals = intervals
+
+
+def compile_schema(fields, partial=False):
+    """Builds a validator function for fields that returns the list of error messages of one item. The fields are
+    unpacked into tuples once, so that a call only walks them. A partial validator skips absent fields and reports
+    unknown ones instead."""
+    steps = [(field.name, field.missing, [(check.condition, check.message) for check in field.checks],
+              field.intervals) for field in fields]
+    names = {field.name for field in fields}
+
+    def validate(item):
+        errors = list()
+        for name, missing, checks, intervals in steps:
+            if name not in item:
+                if partial:
+                    continue
+                if missing is not None:
+                    errors.append(missing)
+                    continue
+            value = item[name]
+            for condition, message in checks:
+                if condition(value):
+                    errors.append(message)
+                    break
+            else:
+                if intervals:
+                    for time_interval in value:
+                        result = validate_time_interval(time_interval)
+                        if result is not None:
+                            errors.append(result)
+        if partial:
+            errors += [f'Unknown field {key}.' for key in item if key not in names]
+        return errors
+
+    return validate
+
+
+COURIER_ID = Field('courier_id',
+                   Check(lambda value: not isinstance(value, int) or value < 1, 'Courier ID must be positive integer.'))
+COURIER_FIELDS = [
+    Field('courier_type',
+          Check(lambda value: not isinstance(value, str), 'Courier type must be a string.'),
+          Check(lambda value: value not in ('foot', 'car', 'bike'),
+                'Courier type must be one of following values: foot, car, bike.'),
+          missing='Courier type must be specified.'),
+    Field('regions',
+          Check(lambda value: not isinstance(value, list), 'Regions must be an array.'),
+          Check(lambda value: len(value) == 0, 'At least one region is required.'),
+          Check(lambda value: not all(isinstance(i, int) and i >= 0 for i in value),
+                'Regions must be positive integers.'),
+          Check(lambda value: len(set(value)) != len(value), 'Regions must be unique'),
+          missing='Courier regions must be specified.'),
+    Field('working_hours',
+          Check(lambda value: not isinstance(value, list), 'Working hours must be a string.'),
+          Check(lambda value: len(value) == 0, 'At least one working time slot is required.'),
+          missing='Courier working hours must be specified', intervals=True),
+]
+
+ORDER_FIELDS = [
+    Field('order_id',
+          Check(lambda value: not isinstance(value, int) or value < 1, 'Order ID must be positive integer.')),
+    Field('weight',
+          Check(lambda value: not isinstance(value, (float, int)), 'Weight must be float.'),
+          Check(lambda value: value < 0.01, 'The weight must be greater than or equal to 0.01.'),
+          Check(lambda value: value > 50, 'The weight must be less than or equal to 50.'),
+          missing='Weight must be specified.'),
+    Field('region',
+          Check(lambda value: not isinstance(value, int) or value < 0, 'Region must be positive integer.'),
+          missing='Region must be specified.'),
+    Field('delivery_hours',
+          Check(lambda value: not isinstance(value, list), 'Delivery hours must be an array.'),
+          Check(lambda value: len(value) == 0, 'At least one delivery time slot is required.'),
+          missing='Delivery hours must be specified.', intervals=True),
+]
+
+validate_courier = compile_schema([COURIER_ID] + COURIER_FIELDS)
+validate_courier_patch = compile_schema(COURIER_FIELDS, partial=True)
+validate_order = compile_schema(ORDER_FIELDS)
@@ -1,19 +1,83 @@
+import os
+import signal
+import socket
+
 from flask import Flask
 from flask_restful import Api
 from waitress import serve
 
-from api.orders import OrdersAssignment, OrdersListResource, OrdersCompletion
+from api.orders import OrdersAssignment, OrdersBulkAssignment, OrdersListResource, OrdersCompletion, \
+    OrdersBulkCompletion, OrderCouriers
 from api.couriers import CouriersListResource, CouriersResource
-from data.db_session import global_init
+from api.metrics import MetricsResource
+from api.analytics import AnalyticsResource
+from api.pool import build_order_pool
+from config import DATABASE, HOST, PORT, SERVER, THREADS, WORKERS
+from data.db_session import dispose, global_init, remove_session
 
 app = Flask(__name__)
 api = Api(app)
+api.add_resource(CouriersListResource, '/couriers')
+api.add_resource(CouriersResource, '/couriers/<int:courier_id>')
+api.add_resource(OrdersListResource, '/orders')
+api.add_resource(OrdersAssignment, '/orders/assign')
+api.add_resource(OrdersBulkAssignment, '/orders/assign/bulk')
+api.add_resource(OrdersCompletion, '/orders/complete')
+api.add_resource(OrdersBulkCompletion, '/orders/complete/bulk')
+api.add_resource(OrderCouriers, '/orders/<int:order_id>/couriers')
+api.add_resource(MetricsResource, '/metrics')
+api.add_resource(AnalyticsResource, '/analytics')
+
+
+@app.teardown_appcontext
+def close_session(exception):
+    remove_session()
+
+
+def serve_workers(workers):
+    """Pre-fork mode: the parent creates the tables and binds the socket, then forks workers which connect to the
+    database on their own and serve the shared socket with waitress. A worker that dies is replaced."""
+    global_init(DATABASE)
+    dispose()
+    sock = socket.create_server((HOST, PORT), backlog=1024)
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            global_init(DATABASE)
+            serve(app, sockets=[sock], threads=THREADS)
+            os._exit(0)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    while children:
+        pid, _ = os.wait()
+        children.discard(pid)
+        if not stopping:
+            spawn()
+
 
 if __name__ == '__main__':
-    global_init('db/database.db')
-    api.add_resource(CouriersListResource, '/couriers')
-    api.add_resource(CouriersResource, '/couriers/<int:courier_id>')
-    api.add_resource(OrdersListResource, '/orders')
-    api.add_resource(OrdersAssignment, '/orders/assign')
-    api.add_resource(OrdersCompletion, '/orders/complete')
-    serve(app, host='0.0.0.0', port=8080)
+    if SERVER == 'uvicorn':
+        import uvicorn
+
+        uvicorn.run('asgi:application', host=HOST, port=PORT, workers=WORKERS, log_level='warning')
+    elif WORKERS > 1:
+        serve_workers(WORKERS)
+    else:
+        global_init(DATABASE)
+        build_order_pool()
+        serve(app, host=HOST, port=PORT, threads=THREADS)
@@ -0,0 +1,58 @@
+"""Moves orders completed more than ARCHIVE_RETENTION_DAYS days ago from orders to orders_archive.
+
+Completed orders are never read by assignment again, yet they stayed in orders next to the open ones and the table,
+with every index on it, grew for as long as the service ran. This job keeps orders down to the open backlog and the
+recent history. Ratings and earnings do not depend on it: they are kept in courier_region_stats and couriers as the
+orders are completed. Completing an archived order again still succeeds and changes nothing, and its id stays taken
+for POST /orders. Run it periodically, e.g. from cron:
+
+    0 3 * * * cd /path/to/candy_delivery_app && python3 archive.py
+"""
+import time
+
+import sqlalchemy as sa
+
+from api.logic import DAY_MS, current_time, format_date
+from config import ARCHIVE_RETENTION_DAYS, DATABASE
+from data.db_session import create_session, global_init
+from data.order import Order
+from data.order_archive import OrderArchive
+
+ARCHIVE_CHUNK_SIZE = 5000
+ARCHIVED_COLUMNS = ('order_id', 'weight', 'region', 'delivery_hours', 'courier_id', 'complete_time')
+
+
+def cutoff(now: int, retention_days: float) -> int:
+    """complete_time before which orders are archived, in epoch milliseconds like now."""
+    return now - int(retention_days * DAY_MS)
+
+
+def archive(session, before: int, chunk_size=ARCHIVE_CHUNK_SIZE) -> int:
+    """Moves the orders completed before the timestamp to orders_archive, chunk_size orders per transaction so that
+    requests are not blocked for long, and returns how many were moved."""
+    columns = [Order.__table__.c[name] for name in ARCHIVED_COLUMNS]
+    moved = 0
+    while True:
+        order_ids = [order_id for order_id, in session.query(Order.order_id)
+                     .filter(Order.complete_time != None, Order.complete_time < before).limit(chunk_size)]
+        if not order_ids:
+            return moved
+        # Completed orders are not changed anymore, so the rows copied are the rows deleted
+        session.execute(OrderArchive.__table__.insert().from_select(
+            ARCHIVED_COLUMNS, sa.select(columns).where(Order.order_id.in_(order_ids))))
+        session.query(Order).filter(Order.order_id.in_(order_ids)).delete(synchronize_session=False)
+        session.commit()
+        moved += len(order_ids)
+
+
+def main():
+    global_init(DATABASE)
+    session = create_session()
+    started = time.perf_counter()
+    before = cutoff(current_time(), ARCHIVE_RETENTION_DAYS)
+    moved = archive(session, before)
+    print(f'Archived {moved} orders completed before {format_date(before)} in {time.perf_counter() - started:.1f} s.')
+
+
+if __name__ == '__main__':
+    main()
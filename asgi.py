@@ -0,0 +1,14 @@
+"""ASGI entry point: `CANDY_SERVER=uvicorn python app.py` or `uvicorn asgi:application`.
+
+Connections are served by the event loop, the Flask handlers themselves stay synchronous and run on THREADS threads
+with the same database pool as under waitress."""
+from a2wsgi import WSGIMiddleware
+
+from api.pool import build_order_pool
+from app import app
+from config import DATABASE, THREADS
+from data.db_session import global_init
+
+global_init(DATABASE)
+build_order_pool()
+application = WSGIMiddleware(app, workers=THREADS)
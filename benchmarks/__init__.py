@@ -0,0 +1,32 @@
+"""Benchmarks of the service, each run as a module from the repository root, e.g. python -m benchmarks.packing."""
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_service(**env):
+    """Starts app.py on a free port of 127.0.0.1 with a fresh database and the settings of env, returns the process and
+    the port once it answers."""
+    port = free_port()
+    env = dict(os.environ, CANDY_DATABASE=os.path.join(tempfile.mkdtemp(), 'benchmark.db'), CANDY_HOST='127.0.0.1',
+               CANDY_PORT=str(port), **env)
+    process = subprocess.Popen([sys.executable, 'app.py'], env=env, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            requests.get(f'http://127.0.0.1:{port}/couriers/1')
+            return process, port
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise Exception('Service did not start.')
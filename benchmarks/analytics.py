@@ -0,0 +1,96 @@
+"""Measures GET /analytics over a year of buckets for REGIONS regions, and the cost of a completion with and without
+the buckets being updated.
+
+    python -m benchmarks.analytics
+"""
+import os
+import random
+import tempfile
+import time
+from unittest import mock
+
+from api.logic import DAY_MS, HOUR_MS, format_date, parse_date
+from app import app
+from data.courier_type_day_stats import CourierTypeDayStats
+from data.courier_type_hour_stats import CourierTypeHourStats
+from data.db_session import create_session, global_init, remove_session
+from data.region_day_stats import RegionDayStats
+from data.region_hour_stats import RegionHourStats
+
+REGIONS = 100
+DAYS = 365
+CALLS = 20
+COMPLETIONS = 300
+START = parse_date('2021-01-01T00:00:00Z')
+RANGES = (('hour', HOUR_MS), ('day', DAY_MS), ('week', 7 * DAY_MS), ('month', 30 * DAY_MS), ('year', 364 * DAY_MS))
+
+
+def fill(session):
+    first_day = START // DAY_MS
+    for day in range(first_day, first_day + DAYS):
+        hours = [{'region': region, 'hour': day * 24 + hour, 'count': random.randint(1, 50),
+                  'total': random.randint(600, 90000)} for region in range(1, REGIONS + 1) for hour in range(24)]
+        session.execute(RegionHourStats.__table__.insert(), hours)
+        session.execute(RegionDayStats.__table__.insert(), [
+            {'region': region, 'day': day, 'count': sum(row['count'] for row in hours[i:i + 24]),
+             'total': sum(row['total'] for row in hours[i:i + 24])} for i, region in zip(range(0, len(hours), 24),
+                                                                          range(1, REGIONS + 1))])
+        session.execute(CourierTypeHourStats.__table__.insert(), [
+            {'courier_type': courier_type, 'hour': day * 24 + hour, 'orders': 40, 'deliveries': 12, 'earnings': 12000}
+            for courier_type in ('foot', 'bike', 'car') for hour in range(24)])
+    session.execute(CourierTypeDayStats.__table__.insert(), [
+        {'courier_type': courier_type, 'day': day, 'orders': 960, 'deliveries': 288, 'earnings': 288000}
+        for courier_type in ('foot', 'bike', 'car') for day in range(first_day, first_day + DAYS)])
+    session.commit()
+
+
+def measure_queries(client):
+    for name, length in RANGES:
+        for params in ({}, {'region': 7}, {'step': 'day'}, {'step': 'day', 'region': 7}):
+            if params.get('step') == 'day' and length < DAY_MS:
+                continue
+            started = time.perf_counter()
+            for _ in range(CALLS):
+                # Starting and ending in the middle of a day, so that hour buckets are read at both ends of the range
+                start = START + 10 * HOUR_MS
+                response = client.get('/analytics', query_string=dict(
+                    params, **{'from': format_date(start), 'to': format_date(start + length)}))
+                assert response.status_code == 200, response.json
+            label = ', '.join([name] + [f'{key} {value}' for key, value in params.items()])
+            print(f'{label:>26} {(time.perf_counter() - started) / CALLS * 1000:>8.2f} ms')
+
+
+def measure_completions(client, first_id):
+    client.post('/couriers', json={'data': [
+        {'courier_id': 1, 'courier_type': 'car', 'regions': [1], 'working_hours': ['00:00-24:00']}]})
+    spent, order_id = 0.0, first_id
+    for _ in range(COMPLETIONS // 3):
+        client.post('/orders', json={'data': [
+            {'order_id': order_id + i, 'weight': 1, 'region': 1, 'delivery_hours': ['00:00-24:00']} for i in range(3)]})
+        assigned = client.post('/orders/assign', json={'courier_id': 1}).json
+        for order in assigned['orders']:
+            started = time.perf_counter()
+            response = client.post('/orders/complete', json={'courier_id': 1, 'order_id': order['id'],
+                                                             'complete_time': assigned['assign_time']})
+            spent += time.perf_counter() - started
+            assert response.status_code == 200, response.json
+        order_id += 3
+    return spent / COMPLETIONS * 1000
+
+
+def main():
+    global_init(os.path.join(tempfile.mkdtemp(), 'benchmark.db'))
+    client = app.test_client()
+    started = time.perf_counter()
+    fill(create_session())
+    remove_session()
+    print(f'{REGIONS} regions x {DAYS * 24} hours of buckets filled in {time.perf_counter() - started:.1f} s')
+    measure_queries(client)
+
+    print(f'POST /orders/complete {measure_completions(client, 1):.2f} ms')
+    with mock.patch('api.orders.record_completion'), mock.patch('api.logic.increment'):
+        print(f'  without analytics {measure_completions(client, 1000000):.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Compares forming deliveries for a whole shift with sequential POST /orders/assign calls, the same calls with the
+in-memory order pool (CANDY_ORDER_POOL) and one POST /orders/assign/bulk, each on a fresh database with the same
+couriers and orders.
+
+    python -m benchmarks.assignment
+"""
+import os
+import random
+import tempfile
+import time
+
+from api.pool import order_pool
+from app import app
+from data.db_session import create_session, dispose, global_init, remove_session
+
+COURIERS = 2000
+ORDERS = 100000
+REGIONS = 200
+
+
+def couriers(rng):
+    return [{'courier_id': i, 'courier_type': rng.choice(('foot', 'bike', 'car')),
+             'regions': rng.sample(range(1, REGIONS + 1), 3), 'working_hours': ['09:00-13:00', '14:00-18:00']}
+            for i in range(1, COURIERS + 1)]
+
+
+def orders(rng):
+    return [{'order_id': i, 'weight': round(rng.uniform(0.01, 10), 2), 'region': rng.randrange(1, REGIONS + 1),
+             'delivery_hours': [rng.choice(('08:00-10:00', '10:00-12:00', '16:00-21:30', '19:00-22:00'))]}
+            for i in range(1, ORDERS + 1)]
+
+
+def prepare():
+    dispose()
+    global_init(os.path.join(tempfile.mkdtemp(), 'benchmark.db'))
+    client = app.test_client()
+    rng = random.Random(0)
+    client.post('/couriers', json={'data': couriers(rng)})
+    client.post('/orders', json={'data': orders(rng)})
+    return client
+
+
+def sequential(client=None):
+    client = client or prepare()
+    started = time.perf_counter()
+    assigned = 0
+    for courier_id in range(1, COURIERS + 1):
+        assigned += len(client.post('/orders/assign', json={'courier_id': courier_id}).json['orders'])
+    return time.perf_counter() - started, assigned
+
+
+def pooled():
+    client = prepare()
+    order_pool.build(create_session())
+    remove_session()
+    return sequential(client)
+
+
+def bulk():
+    client = prepare()
+    started = time.perf_counter()
+    response = client.post('/orders/assign/bulk', json={'courier_ids': list(range(1, COURIERS + 1))})
+    assigned = sum(len(courier['orders']) for courier in response.json['couriers'])
+    return time.perf_counter() - started, assigned
+
+
+def main():
+    print(f'{COURIERS} couriers, {ORDERS} orders in {REGIONS} regions')
+    # pooled goes last, the pool stays on once built
+    for name, run in (('sequential', sequential), ('bulk', bulk), ('pooled', pooled)):
+        spent, assigned = run()
+        print(f'{name:>10} {spent:>7.2f} s {assigned:>7} orders assigned')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Measures GET /couriers/{courier_id} throughput and latency while orders are being added, assigned and completed.
+
+The service is started as a separate process for every profile of database settings, so the numbers include the real
+waitress server and SQLite locking.
+
+    python -m benchmarks.concurrency
+"""
+import random
+import threading
+import time
+
+import requests
+
+from benchmarks import start_service
+
+PROFILES = {
+    'rollback journal': {'CANDY_SQLITE_JOURNAL_MODE': 'DELETE', 'CANDY_SQLITE_SYNCHRONOUS': 'FULL',
+                         'CANDY_SQLITE_MMAP_SIZE': '0', 'CANDY_SQLITE_CACHE_SIZE': '-2000'},
+    'tuned (default)': {},
+}
+COURIERS = 200
+READERS = 8
+WRITERS = 4
+DURATION = 5
+
+
+def write(address, writer, writes, failures, stop):
+    session = requests.Session()
+    rng = random.Random(writer)
+    order_id = writer * 10 ** 7
+    while not stop.is_set():
+        courier_id = rng.randrange(1, COURIERS + 1)
+        data = [{'order_id': order_id + i, 'weight': 0.5, 'region': courier_id % 20, 'delivery_hours': ['00:00-24:00']}
+                for i in range(10)]
+        order_id += 10
+        responses = [session.post(address + 'orders', json={'data': data}),
+                     session.post(address + 'orders/assign', json={'courier_id': courier_id})]
+        if responses[-1].status_code == 200:
+            assigned = responses[-1].json()
+            for order in assigned['orders']:
+                responses.append(session.post(address + 'orders/complete', json={
+                    'courier_id': courier_id, 'order_id': order['id'], 'complete_time': assigned['assign_time']}))
+        writes.extend(response for response in responses if response.status_code < 500)
+        failures.extend(response for response in responses if response.status_code >= 500)
+
+
+def read(address, latencies, failures, stop):
+    session = requests.Session()
+    rng = random.Random()
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = session.get(address + f'couriers/{rng.randrange(1, COURIERS + 1)}')
+        latencies.append(time.perf_counter() - started)
+        if response.status_code >= 500:
+            failures.append(response)
+
+
+def run(settings):
+    process, port = start_service(CANDY_THREADS=str(READERS + WRITERS), **settings)
+    address = f'http://127.0.0.1:{port}/'
+    try:
+        requests.post(address + 'couriers', json={'data': [
+            {'courier_id': i, 'courier_type': 'car', 'regions': [i % 20], 'working_hours': ['00:00-24:00']}
+            for i in range(1, COURIERS + 1)]})
+        stop = threading.Event()
+        latencies, writes, failures = list(), list(), list()
+        threads = [threading.Thread(target=write, args=(address, i, writes, failures, stop))
+                   for i in range(1, WRITERS + 1)]
+        threads += [threading.Thread(target=read, args=(address, latencies, failures, stop)) for _ in range(READERS)]
+        for thread in threads:
+            thread.start()
+        time.sleep(DURATION)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        latencies.sort()
+        return (len(latencies) / DURATION, latencies[len(latencies) // 2], latencies[len(latencies) * 99 // 100],
+                len(writes) / DURATION, len(failures))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    print(f'{"profile":>18} {"GET/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"writes/s":>9} {"errors":>7}')
+    for name, settings in PROFILES.items():
+        throughput, p50, p99, writes, failures = run(settings)
+        print(f'{name:>18} {throughput:>8.0f} {p50 * 1000:>8.1f} {p99 * 1000:>8.1f} {writes:>9.0f} {failures:>7}')
+
+
+if __name__ == '__main__':
+    main()
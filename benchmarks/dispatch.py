@@ -0,0 +1,74 @@
+"""Measures dispatch.plan on up to 10 thousand couriers and 500 thousand orders and compares the plan with what the
+same couriers get calling POST /orders/assign one after another (first come, first served).
+
+    python -m benchmarks.dispatch
+"""
+import heapq
+import random
+import time
+from collections import defaultdict, namedtuple
+from operator import attrgetter
+
+from api.logic import calculate_capacity, matching_orders, pack_orders, time_mask
+from dispatch import Candidate, plan
+
+Courier = namedtuple('Courier', 'courier_id courier_type regions working_mask')
+SIZES = ((10000, 20000), (1000, 50000), (10000, 500000))
+REGIONS = 1000
+WORKING_HOURS = (['09:00-13:00', '14:00-18:00'], ['08:00-20:00'], ['12:00-22:00'], ['07:00-11:00'])
+DELIVERY_HOURS = (['08:00-10:00'], ['10:00-12:00'], ['12:00-14:00'], ['16:00-21:30'], ['19:00-22:00'])
+
+
+def generate(couriers, orders, rng):
+    working = [time_mask(hours) for hours in WORKING_HOURS]
+    delivery = [time_mask(hours) for hours in DELIVERY_HOURS]
+    return ([Courier(i, rng.choice(('foot', 'bike', 'car')), rng.sample(range(1, REGIONS + 1), 3),
+                     rng.choice(working)) for i in range(1, couriers + 1)],
+            [Candidate(i, round(rng.uniform(0.01, 10), 2), rng.randrange(1, REGIONS + 1), rng.choice(delivery))
+             for i in range(1, orders + 1)])
+
+
+def first_come_first_served(couriers, orders):
+    pool = defaultdict(list)
+    for order in sorted(orders, key=attrgetter('weight')):
+        pool[order.region].append(order)
+    taken, deliveries = set(), dict()
+    for courier in couriers:
+        candidates = (order for order in heapq.merge(*(pool[region] for region in courier.regions),
+                                                     key=attrgetter('weight')) if order.order_id not in taken)
+        packed = pack_orders(matching_orders(courier.working_mask, candidates, 64),
+                             calculate_capacity(courier.courier_type))
+        deliveries[courier.courier_id] = [order.order_id for order in packed]
+        taken.update(deliveries[courier.courier_id])
+        for region in courier.regions:
+            orders, head = pool[region], 0
+            while head < len(orders) and orders[head].order_id in taken:
+                head += 1
+            del orders[:head]
+    return deliveries
+
+
+def summary(name, deliveries, weights, spent):
+    served = [orders for orders in deliveries.values() if orders]
+    delivered = sum(len(orders) for orders in served)
+    weight = sum(weights[order_id] for orders in served for order_id in orders)
+    print(f'{name:>26} {spent:>7.2f} s {delivered:>8} orders {weight:>10.0f} kg {len(served):>6} couriers served')
+
+
+def main():
+    rng = random.Random(0)
+    for courier_count, order_count in SIZES:
+        couriers, orders = generate(courier_count, order_count, rng)
+        weights = {order.order_id: order.weight for order in orders}
+        print(f'{courier_count} couriers, {order_count} orders')
+        for strategy in ('greedy', 'knapsack'):
+            started = time.perf_counter()
+            deliveries = plan(couriers, orders, strategy, time_budget=600)
+            summary(f'dispatch.plan ({strategy})', deliveries, weights, time.perf_counter() - started)
+        started = time.perf_counter()
+        deliveries = first_come_first_served(couriers, orders)
+        summary('first come, first served', deliveries, weights, time.perf_counter() - started)
+
+
+if __name__ == '__main__':
+    main()
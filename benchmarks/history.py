@@ -0,0 +1,61 @@
+"""Measures POST /orders/assign and POST /orders/complete for a courier with a long delivery history.
+
+    python -m benchmarks.history
+"""
+import os
+import tempfile
+import time
+from collections import defaultdict
+
+from api.logic import parse_date, time_mask
+from app import app
+from data.db_session import create_session, global_init, remove_session
+from data.order import Order
+
+HISTORY = 100000
+ROUNDS = 50
+ORDERS_PER_ROUND = 3
+
+
+def main():
+    global_init(os.path.join(tempfile.mkdtemp(), 'benchmark.db'))
+    client = app.test_client()
+    client.post('/couriers', json={'data': [
+        {'courier_id': 1, 'courier_type': 'car', 'regions': [1], 'working_hours': ['00:00-24:00']}]})
+    session = create_session()
+    mask = time_mask(['00:00-24:00'])
+    session.execute(Order.__table__.insert(), [
+        {'order_id': i, 'weight': 1, 'region': 1, 'delivery_hours': ['00:00-24:00'], 'delivery_mask': mask,
+         'courier_id': 1, 'complete_time': parse_date('2021-01-01T10:00:00.00Z')} for i in range(1, HISTORY + 1)])
+    session.commit()
+    remove_session()
+
+    spent = defaultdict(float)
+
+    def measure(name, url, data):
+        started = time.perf_counter()
+        response = client.post(url, json=data)
+        spent[name] += time.perf_counter() - started
+        assert response.status_code == 200, response.json
+        return response.json
+
+    order_id = HISTORY
+    for _ in range(ROUNDS):
+        client.post('/orders', json={'data': [
+            {'order_id': order_id + i, 'weight': 1, 'region': 1, 'delivery_hours': ['00:00-24:00']}
+            for i in range(1, ORDERS_PER_ROUND + 1)]})
+        assigned = measure('assign', '/orders/assign', {'courier_id': 1})
+        measure('assign again', '/orders/assign', {'courier_id': 1})
+        for order in assigned['orders']:
+            measure('complete', '/orders/complete', {'courier_id': 1, 'order_id': order['id'],
+                                                     'complete_time': assigned['assign_time']})
+        order_id += ORDERS_PER_ROUND
+
+    print(f'courier with {HISTORY} delivered orders')
+    for name, seconds in spent.items():
+        calls = ROUNDS * (ORDERS_PER_ROUND if name == 'complete' else 1)
+        print(f'{name:>13} {seconds / calls * 1000:>8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
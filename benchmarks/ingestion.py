@@ -0,0 +1,42 @@
+"""Measures POST /couriers and POST /orders throughput on large batches.
+
+    python -m benchmarks.ingestion
+"""
+import os
+import random
+import tempfile
+import time
+
+from app import app
+from data.db_session import global_init
+
+
+def couriers(size, rng):
+    return [{'courier_id': i, 'courier_type': rng.choice(('foot', 'bike', 'car')),
+             'regions': rng.sample(range(1, 500), 3), 'working_hours': ['09:00-13:00', '14:00-18:00']}
+            for i in range(1, size + 1)]
+
+
+def orders(size, rng):
+    return [{'order_id': i, 'weight': round(rng.uniform(0.01, 50), 2), 'region': rng.randrange(1, 500),
+             'delivery_hours': ['10:00-12:00', '16:00-21:30']} for i in range(1, size + 1)]
+
+
+def measure(client, url, data):
+    started = time.perf_counter()
+    response = client.post(url, json={'data': data})
+    spent = time.perf_counter() - started
+    assert response.status_code == 201, response.json
+    print(f'{url:>10} {len(data):>7} items {spent:>7.2f} s {len(data) / spent:>9.0f} items/s')
+
+
+def main():
+    global_init(os.path.join(tempfile.mkdtemp(), 'benchmark.db'))
+    rng = random.Random(0)
+    client = app.test_client()
+    measure(client, '/couriers', couriers(10000, rng))
+    measure(client, '/orders', orders(50000, rng))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Compares order packing strategies on synthetic backlogs.
+
+A courier drains a backlog delivery by delivery; for every strategy the script reports how many deliveries (and so
+end_session_for_courier payouts) it took, the average loaded weight and the time spent packing.
+
+    python -m benchmarks.packing
+"""
+import random
+import time
+
+from api.logic import calculate_capacity, pack_orders, PACKING_STRATEGIES
+
+
+class Order:
+    def __init__(self, weight):
+        self.weight = weight
+
+
+def backlog(size, rng):
+    return sorted((Order(round(rng.uniform(0.01, 10), 2)) for _ in range(size)), key=lambda order: order.weight)
+
+
+def drain(orders, capacity, strategy):
+    deliveries, spent = 0, 0.0
+    while orders:
+        started = time.perf_counter()
+        packed = pack_orders(orders, capacity, strategy)
+        spent += time.perf_counter() - started
+        if len(packed) == 0:
+            break
+        deliveries += 1
+        packed = set(map(id, packed))
+        orders = [order for order in orders if id(order) not in packed]
+    return deliveries, spent
+
+
+def main():
+    print(f'{"courier":>8} {"orders":>7} {"strategy":>9} {"deliveries":>11} {"kg/delivery":>12} {"ms/delivery":>12}')
+    for courier_type in ('foot', 'bike', 'car'):
+        capacity = calculate_capacity(courier_type)
+        for size in (100, 1000):
+            orders = backlog(size, random.Random(size))
+            total = sum(order.weight for order in orders)
+            for strategy in PACKING_STRATEGIES:
+                deliveries, spent = drain(orders, capacity, strategy)
+                print(f'{courier_type:>8} {size:>7} {strategy:>9} {deliveries:>11} {total / deliveries:>12.2f} '
+                      f'{spent / deliveries * 1000:>12.3f}')
+
+
+if __name__ == '__main__':
+    main()
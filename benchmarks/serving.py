@@ -0,0 +1,79 @@
+"""Compares GET /couriers/{courier_id} latency of the waitress and uvicorn servers at different numbers of open
+connections.
+
+Every client keeps one keep-alive connection and sends requests back to back, the clients are asyncio tasks so a
+thousand of them do not need a thousand threads on the benchmark side.
+
+    python -m benchmarks.serving
+"""
+import asyncio
+import random
+import time
+
+import requests
+
+from benchmarks import start_service
+
+SERVERS = ('waitress', 'uvicorn')
+CONNECTIONS = (10, 100, 1000)
+COURIERS = 200
+DURATION = 5
+
+
+async def client(port, deadline, latencies, failures):
+    rng = random.Random()
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        failures.append(None)
+        return
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            writer.write(f'GET /couriers/{rng.randrange(1, COURIERS + 1)} HTTP/1.1\r\nHost: benchmark\r\n\r\n'.encode())
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = next(int(line.split(b':')[1]) for line in head.split(b'\r\n')
+                          if line.lower().startswith(b'content-length:'))
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+            if not head.startswith(b'HTTP/1.1 200'):
+                failures.append(head)
+    except (OSError, asyncio.IncompleteReadError) as error:
+        failures.append(error)
+    finally:
+        writer.close()
+
+
+async def load(port, connections):
+    latencies, failures = list(), list()
+    deadline = time.perf_counter() + DURATION
+    await asyncio.gather(*(client(port, deadline, latencies, failures) for _ in range(connections)))
+    return latencies, failures
+
+
+def run(server):
+    process, port = start_service(CANDY_SERVER=server)
+    try:
+        requests.post(f'http://127.0.0.1:{port}/couriers', json={'data': [
+            {'courier_id': i, 'courier_type': 'car', 'regions': [i % 20], 'working_hours': ['00:00-24:00']}
+            for i in range(1, COURIERS + 1)]})
+        for connections in CONNECTIONS:
+            latencies, failures = asyncio.run(load(port, connections))
+            latencies.sort()
+            yield (connections, len(latencies) / DURATION, latencies[len(latencies) // 2],
+                   latencies[len(latencies) * 99 // 100], len(failures))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    print(f'{"server":>9} {"connections":>12} {"GET/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"errors":>7}')
+    for server in SERVERS:
+        for connections, throughput, p50, p99, failures in run(server):
+            print(f'{server:>9} {connections:>12} {throughput:>8.0f} {p50 * 1000:>8.1f} {p99 * 1000:>8.1f} '
+                  f'{failures:>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Compares the timestamp handling of a completion with string columns, as it was, and with epoch milliseconds.
+
+    python -m benchmarks.timestamps
+"""
+import datetime
+import timeit
+
+from api.logic import calculate_time, current_time, format_date, parse_date
+
+CALLS = 200000
+ASSIGNED = '2021-01-10T10:33:01.42Z'
+COMPLETED = '2021-01-10T10:45:13.07Z'
+
+
+def old_format_date(date: datetime.datetime):
+    return date.isoformat('T')[:-4] + 'Z'
+
+
+def old_parse_date(date: str) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(date[:-4])
+
+
+def old_calculate_time(time1: str, time2: str) -> int:
+    return (old_parse_date(time2) - old_parse_date(time1)).seconds
+
+
+def measure(name, statement):
+    seconds = timeit.timeit(statement, number=CALLS)
+    print(f'{name:>32} {seconds / CALLS * 1e9:>8.0f} ns')
+
+
+def main():
+    assigned = parse_date(ASSIGNED)
+    print('strings, as before')
+    measure('format assign_time', lambda: old_format_date(datetime.datetime.utcnow()))
+    # The last action time was stored as a string and parsed again on every completion
+    measure('complete: delivery time', lambda: old_calculate_time(ASSIGNED, COMPLETED))
+    print('epoch milliseconds')
+    measure('format assign_time', lambda: format_date(current_time()))
+    measure('complete: delivery time', lambda: calculate_time(assigned, parse_date(COMPLETED)))
+    measure('parse, offset and 4 digit fraction', lambda: parse_date('2021-01-10T13:45:13.0712+03:00'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""Compares per-item validation cost of the schemas with the hand-written checks they replaced.
+
+Both validators run over the same 100k-item payloads (one item in ten is invalid) and must report the same errors.
+
+    python -m benchmarks.validation
+"""
+import random
+import time
+
+from api.schemas import validate_courier, validate_order
+
+
+def legacy_validate_time_interval(time_interval):
+    if len(time_interval) != 11:
+        return 'Wrong time interval format. Correct usage: "HH:MM-HH:MM"'
+    try:
+        start, end = time_interval.split('-')
+        start, end = list(map(int, start.split(':'))), list(map(int, end.split(':')))
+    except Exception:
+        return 'Wrong time interval format. Correct usage: "HH:MM-HH:MM"'
+    if not (0 <= start[0] <= 24 and 0 <= end[0] <= 24 and 0 <= start[1] <= 60 and 0 <= end[1] <= 60):
+        return 'There are only 24 hours in a day and 60 minutes in an hour.'
+    return None
+
+
+def legacy_validate_courier(dataset):
+    errors = list()
+
+    if not isinstance(dataset['courier_id'], int) or dataset['courier_id'] < 1:
+        errors.append('Courier ID must be positive integer.')
+
+    if 'courier_type' not in dataset:
+        errors.append('Courier type must be specified.')
+    elif not isinstance(dataset['courier_type'], str):
+        errors.append('Courier type must be a string.')
+    elif dataset['courier_type'] not in ('foot', 'car', 'bike'):
+        errors.append('Courier type must be one of following values: foot, car, bike.')
+
+    if 'regions' not in dataset:
+        errors.append('Courier regions must be specified.')
+    elif not isinstance(dataset['regions'], list):
+        errors.append('Regions must be an array.')
+    elif len(dataset['regions']) == 0:
+        errors.append('At least one region is required.')
+    elif any([True for i in dataset['regions'] if not (isinstance(i, int) and i >= 0)]):
+        errors.append('Regions must be positive integers.')
+    elif len(set(dataset['regions'])) != len(dataset['regions']):
+        errors.append('Regions must be unique')
+
+    if 'working_hours' not in dataset:
+        errors.append('Courier working hours must be specified')
+    elif not isinstance(dataset['working_hours'], list):
+        errors.append('Working hours must be a string.')
+    elif len(dataset['working_hours']) == 0:
+        errors.append('At least one working time slot is required.')
+    else:
+        for time_interval in dataset['working_hours']:
+            result = legacy_validate_time_interval(time_interval)
+            if result is not None:
+                errors.append(result)
+
+    return errors
+
+
+def legacy_validate_order(dataset):
+    errors = list()
+
+    if not isinstance(dataset['order_id'], int) or dataset['order_id'] < 1:
+        errors.append('Order ID must be positive integer.')
+
+    if 'weight' not in dataset:
+        errors.append('Weight must be specified.')
+    elif not (isinstance(dataset['weight'], float) or isinstance(dataset['weight'], int)):
+        errors.append('Weight must be float.')
+    elif dataset['weight'] < 0.01:
+        errors.append('The weight must be greater than or equal to 0.01.')
+    elif dataset['weight'] > 50:
+        errors.append('The weight must be less than or equal to 50.')
+
+    if 'region' not in dataset:
+        errors.append('Region must be specified.')
+    elif not isinstance(dataset['region'], int) or dataset['region'] < 0:
+        errors.append('Region must be positive integer.')
+
+    if 'delivery_hours' not in dataset:
+        errors.append('Delivery hours must be specified.')
+    elif not isinstance(dataset['delivery_hours'], list):
+        errors.append('Delivery hours must be an array.')
+    elif len(dataset['delivery_hours']) == 0:
+        errors.append('At least one delivery time slot is required.')
+    else:
+        for time_interval in dataset['delivery_hours']:
+            result = legacy_validate_time_interval(time_interval)
+            if result is not None:
+                errors.append(result)
+
+    return errors
+
+
+def couriers(size, rng):
+    items = [{'courier_id': i, 'courier_type': rng.choice(('foot', 'bike', 'car')),
+              'regions': rng.sample(range(1, 500), 3), 'working_hours': ['09:00-13:00', '14:00-18:00']}
+             for i in range(1, size + 1)]
+    for item in items[::10]:
+        item[rng.choice(('courier_type', 'regions', 'working_hours'))] = rng.choice(('', [], ['no'], ['25:00-26:00']))
+    return items
+
+
+def orders(size, rng):
+    items = [{'order_id': i, 'weight': round(rng.uniform(0.01, 50), 2), 'region': rng.randrange(1, 500),
+              'delivery_hours': ['10:00-12:00', '16:00-21:30']} for i in range(1, size + 1)]
+    for item in items[::10]:
+        item[rng.choice(('weight', 'region', 'delivery_hours'))] = rng.choice((-1, 'two', [], ['9:00-12:00']))
+    return items
+
+
+def measure(name, validate, items):
+    started = time.perf_counter()
+    errors = [validate(item) for item in items]
+    spent = time.perf_counter() - started
+    print(f'{name:>16} {spent / len(items) * 1e6:>8.2f} us/item')
+    return errors
+
+
+def main():
+    rng = random.Random(0)
+    for name, legacy, schema, items in (
+            ('couriers', legacy_validate_courier, validate_courier, couriers(100000, rng)),
+            ('orders', legacy_validate_order, validate_order, orders(100000, rng))):
+        print(f'{name}, {len(items)} items')
+        before = measure('hand-written', legacy, items)
+        after = measure('schema', schema, items)
+        assert before == after
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Measures how throughput of POST /orders and of POST /orders/assign with POST /orders/complete scales with the
+number of server processes.
+
+The service is started with CANDY_WORKERS set to each value of WORKERS, more workers only help up to the number of
+cores of the machine.
+
+    python -m benchmarks.workers
+"""
+import threading
+import time
+
+import requests
+
+from benchmarks import start_service
+
+WORKERS = (1, 2, 4)
+CLIENTS = 8
+BATCH = 1000
+COURIERS = 400
+DURATION = 5
+
+
+def measure(target, clients):
+    """Runs target(client, counter) in clients threads for DURATION seconds, returns the counted operations per
+    second."""
+    stop, counts = threading.Event(), [0] * clients
+
+    def loop(client):
+        while not stop.is_set():
+            counts[client] += target(client)
+
+    threads = [threading.Thread(target=loop, args=(client,)) for client in range(clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / DURATION
+
+
+def run(workers):
+    process, port = start_service(CANDY_WORKERS=str(workers))
+    address = f'http://127.0.0.1:{port}/'
+    try:
+        sessions = [requests.Session() for _ in range(CLIENTS)]
+        next_ids = [client * 10 ** 8 for client in range(CLIENTS)]
+
+        def ingest(client):
+            order_id = next_ids[client]
+            next_ids[client] += BATCH
+            data = [{'order_id': order_id + i, 'weight': 0.5 + i % 20, 'region': i % 20,
+                     'delivery_hours': ['09:00-12:00', '14:00-18:00']} for i in range(BATCH)]
+            return BATCH if sessions[client].post(address + 'orders', json={'data': data}).status_code == 201 else 0
+
+        ingested = measure(ingest, CLIENTS)
+
+        requests.post(address + 'couriers', json={'data': [
+            {'courier_id': i, 'courier_type': 'car', 'regions': [i % 20], 'working_hours': ['10:00-15:00']}
+            for i in range(1, COURIERS + 1)]})
+
+        def assign(client):
+            # Each client serves its own couriers, completing a delivery as soon as it is assigned
+            courier_id = next_ids[client] % (COURIERS // CLIENTS) * CLIENTS + client + 1
+            next_ids[client] += 1
+            response = sessions[client].post(address + 'orders/assign', json={'courier_id': courier_id}).json()
+            if 'orders' not in response:
+                return 0
+            for order in response['orders']:
+                sessions[client].post(address + 'orders/complete', json={
+                    'courier_id': courier_id, 'order_id': order['id'], 'complete_time': response['assign_time']})
+            return 1 + len(response['orders'])
+
+        assigned = measure(assign, CLIENTS)
+        return ingested, assigned
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    print(f'{"workers":>8} {"orders/s":>10} {"assign and complete requests/s":>31}')
+    for workers in WORKERS:
+        ingested, assigned = run(workers)
+        print(f'{workers:>8} {ingested:>10.0f} {assigned:>31.0f}')
+
+
+if __name__ == '__main__':
+    main()
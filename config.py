@@ -0,0 +1,54 @@
+import os
+
+DATABASE = os.environ.get('CANDY_DATABASE', 'db/database.db')
+HOST = os.environ.get('CANDY_HOST', '0.0.0.0')
+PORT = int(os.environ.get('CANDY_PORT', '8080'))
+# Server started by app.py: 'waitress' is a threaded WSGI server, 'uvicorn' keeps connections on an asyncio event loop
+# (asgi.py) and only hands complete requests to THREADS worker threads, so idle and slow clients do not hold them.
+SERVER = os.environ.get('CANDY_SERVER', 'waitress')
+# Server processes. Above 1 the requests are spread over that many forked processes, each with THREADS threads and
+# a database pool of its own, so they are not limited to one core by the GIL. Not available on Windows.
+WORKERS = int(os.environ.get('CANDY_WORKERS', '1'))
+# Waitress worker threads, the database connection pool keeps as many connections open. Connections above that are
+# closed once returned, -1 allows any number of them.
+THREADS = int(os.environ.get('CANDY_THREADS', '4'))
+DB_POOL_SIZE = int(os.environ.get('CANDY_DB_POOL_SIZE', str(THREADS)))
+DB_MAX_OVERFLOW = int(os.environ.get('CANDY_DB_MAX_OVERFLOW', str(THREADS)))
+DB_POOL_TIMEOUT = float(os.environ.get('CANDY_DB_POOL_TIMEOUT', '30'))
+# Pragmas set on every new SQLite connection. WAL lets readers work while an assignment is being written.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('CANDY_SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('CANDY_SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('CANDY_SQLITE_BUSY_TIMEOUT', '5000')),
+    'mmap_size': int(os.environ.get('CANDY_SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+    'cache_size': int(os.environ.get('CANDY_SQLITE_CACHE_SIZE', str(-64 * 1024))),
+}
+
+# Rendered GET /couriers/{courier_id} responses are cached for COURIER_CACHE_TTL seconds, at most COURIER_CACHE_SIZE
+# of them per process (0 turns the cache off, so do several WORKERS). With COURIER_CACHE_REDIS set to a redis:// URL
+# they are kept in Redis instead and shared by all the workers, which needs the redis package.
+COURIER_CACHE_SIZE = int(os.environ.get('CANDY_COURIER_CACHE_SIZE', '10000'))
+COURIER_CACHE_TTL = float(os.environ.get('CANDY_COURIER_CACHE_TTL', '5'))
+COURIER_CACHE_REDIS = os.environ.get('CANDY_COURIER_CACHE_REDIS')
+
+# Orders packing strategy for /orders/assign: 'greedy' takes the lightest orders first and so maximizes the number
+# of orders per delivery, 'knapsack' maximizes the loaded weight.
+PACKING_STRATEGY = os.environ.get('CANDY_PACKING_STRATEGY', 'greedy')
+# Seconds the knapsack strategy may spend on one delivery before finishing greedily.
+PACKING_TIME_BUDGET = float(os.environ.get('CANDY_PACKING_TIME_BUDGET', '0.05'))
+# Seconds dispatch.py may spend planning before it stages what it has planned so far.
+DISPATCH_TIME_BUDGET = float(os.environ.get('CANDY_DISPATCH_TIME_BUDGET', '60'))
+# Seconds an order dispatch.py planned for a courier is kept from the others. Afterwards anyone may take it and the
+# courier, which has evidently not asked for orders, is left out of the next plans until its stale orders are gone.
+DISPATCH_STAGE_TTL = float(os.environ.get('CANDY_DISPATCH_STAGE_TTL', '300'))
+# With CANDY_ORDER_POOL=1 the free orders are kept in memory sorted by weight (api/pool.py) and POST /orders/assign
+# takes its candidates from there instead of the database. Only used with a single worker process.
+ORDER_POOL = os.environ.get('CANDY_ORDER_POOL', '0') == '1'
+# Seconds POST /orders/assign answers a courier it has just found no orders for without looking again, unless orders
+# appear in the courier's regions. Only used with a single worker process, other processes do not report new orders.
+ASSIGN_EMPTY_TTL = float(os.environ.get('CANDY_ASSIGN_EMPTY_TTL', '10'))
+# Days a completed order stays in the orders table before archive.py moves it to orders_archive.
+ARCHIVE_RETENTION_DAYS = float(os.environ.get('CANDY_ARCHIVE_RETENTION_DAYS', '30'))
+# Request bodies of POST /couriers and POST /orders larger than this many bytes are parsed and inserted item by item
+# as they are read instead of being loaded into memory as a whole.
+STREAMING_THRESHOLD = int(os.environ.get('CANDY_STREAMING_THRESHOLD', str(1024 * 1024)))
@@ -0,0 +1 @@
+# Makes the project root importable for unit tests that use api and data modules directly.
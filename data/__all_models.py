@@ -1,2 +1,8 @@
 from . import order
-from . import courier
\ No newline at end of file
+from . import courier
+from . import courier_region_stats
+from . import order_archive
+from . import region_hour_stats
+from . import region_day_stats
+from . import courier_type_day_stats
+from . import courier_type_hour_stats
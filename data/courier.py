@@ -1,8 +1,7 @@
 from sqlalchemy.orm import relation
-from sqlalchemy_json import mutable_json_type
-from .db_session import SqlAlchemyBase
+from .db_session import SqlAlchemyBase, Json
 from sqlalchemy import Column
-from sqlalchemy.sql.sqltypes import Integer, String, JSON
+from sqlalchemy.sql.sqltypes import BigInteger, Integer, Float, String, LargeBinary
 
 
 class Courier(SqlAlchemyBase):
@@ -10,12 +9,14 @@ class Courier(SqlAlchemyBase):
 
     courier_id = Column(Integer, primary_key=True, nullable=False)
     courier_type = Column(String, nullable=False)
-    regions = Column(JSON, nullable=False)
-    working_hours = Column(JSON, nullable=False)
-    assign_time = Column(String)
+    regions = Column(Json, nullable=False)
+    working_hours = Column(Json, nullable=False)
+    working_mask = Column(LargeBinary, nullable=False)
+    # Timestamps are epoch milliseconds, the API formats them with api.logic.format_date
+    assign_time = Column(BigInteger, index=True)
     courier_type_when_formed = Column(String)
     earnings = Column(Integer, default=0)
-    delivery_time_for_regions = Column(mutable_json_type(dbtype=JSON, nested=True), default={})
-    last_action_time = Column(String, default=None)
+    min_average_time = Column(Float, default=None)
+    last_action_time = Column(BigInteger, default=None)
 
-    orders = relation('Order', back_populates='courier')
+    orders = relation('Order', back_populates='courier', order_by='Order.order_id')
@@ -0,0 +1,12 @@
+from .db_session import SqlAlchemyBase
+from sqlalchemy import Column, ForeignKey
+from sqlalchemy.sql.sqltypes import Integer
+
+
+class CourierRegionStats(SqlAlchemyBase):
+    __tablename__ = 'courier_region_stats'
+
+    courier_id = Column(Integer, ForeignKey('couriers.courier_id'), primary_key=True)
+    region = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False)
+    total = Column(Integer, nullable=False)
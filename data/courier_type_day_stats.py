@@ -0,0 +1,16 @@
+from .db_session import SqlAlchemyBase
+from sqlalchemy import Column
+from sqlalchemy.sql.sqltypes import BigInteger, Integer, String
+
+
+class CourierTypeDayStats(SqlAlchemyBase):
+    """Orders completed and deliveries paid for by the couriers of a type during a day, CourierTypeHourStats summed up
+    so that long ranges read fewer rows."""
+    __tablename__ = 'courier_type_day_stats'
+
+    courier_type = Column(String, primary_key=True)
+    # Days since the epoch, UTC
+    day = Column(Integer, primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    deliveries = Column(Integer, nullable=False, default=0)
+    earnings = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,15 @@
+from .db_session import SqlAlchemyBase
+from sqlalchemy import Column
+from sqlalchemy.sql.sqltypes import BigInteger, Integer, String
+
+
+class CourierTypeHourStats(SqlAlchemyBase):
+    """Orders completed and deliveries paid for by the couriers of a type during an hour, for GET /analytics."""
+    __tablename__ = 'courier_type_hour_stats'
+
+    courier_type = Column(String, primary_key=True)
+    # Hours since the epoch, complete_time // HOUR_MS
+    hour = Column(Integer, primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    deliveries = Column(Integer, nullable=False, default=0)
+    earnings = Column(BigInteger, nullable=False, default=0)
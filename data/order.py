@@ -1,17 +1,32 @@
 from sqlalchemy.orm import relation
-from .db_session import SqlAlchemyBase
-from sqlalchemy import Column, ForeignKey
-from sqlalchemy.sql.sqltypes import Integer, JSON, Float, String
+from .db_session import SqlAlchemyBase, Json
+from sqlalchemy import Column, ForeignKey, Index, text
+from sqlalchemy.sql.sqltypes import BigInteger, Integer, Float, LargeBinary
 
 
 class Order(SqlAlchemyBase):
     __tablename__ = 'orders'
+    __table_args__ = (
+        Index('ix_orders_region_courier_complete_weight', 'region', 'courier_id', 'complete_time', 'weight'),
+        # Only the orders being delivered, a courier's history does not bloat it
+        Index('ix_orders_open_courier_weight', 'courier_id', 'weight',
+              sqlite_where=text('complete_time IS NULL AND courier_id IS NOT NULL'),
+              postgresql_where=text('complete_time IS NULL AND courier_id IS NOT NULL')),
+        Index('ix_orders_staged_courier', 'staged_courier_id'),
+        # Completed orders by age for archive.py
+        Index('ix_orders_complete_time', 'complete_time', sqlite_where=text('complete_time IS NOT NULL'),
+              postgresql_where=text('complete_time IS NOT NULL')),
+    )
 
     order_id = Column(Integer, primary_key=True)
     weight = Column(Float)
     region = Column(Integer)
-    delivery_hours = Column(JSON)
-    complete_time = Column(String, default=None)
+    delivery_hours = Column(Json)
+    delivery_mask = Column(LargeBinary)
+    complete_time = Column(BigInteger, default=None)
 
     courier_id = Column(Integer, ForeignKey('couriers.courier_id'))
     courier = relation('Courier')
+    # Courier the last dispatch.py run planned this order for and since when, in epoch milliseconds, see there
+    staged_courier_id = Column(Integer, default=None)
+    staged_time = Column(BigInteger, default=None)
@@ -0,0 +1,16 @@
+from .db_session import SqlAlchemyBase, Json
+from sqlalchemy import Column, ForeignKey
+from sqlalchemy.sql.sqltypes import BigInteger, Integer, Float
+
+
+class OrderArchive(SqlAlchemyBase):
+    """Completed orders moved out of orders by archive.py."""
+    __tablename__ = 'orders_archive'
+
+    order_id = Column(Integer, primary_key=True)
+    weight = Column(Float)
+    region = Column(Integer)
+    delivery_hours = Column(Json)
+    complete_time = Column(BigInteger)
+
+    courier_id = Column(Integer, ForeignKey('couriers.courier_id'), index=True)
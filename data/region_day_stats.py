@@ -0,0 +1,14 @@
+from .db_session import SqlAlchemyBase
+from sqlalchemy import Column
+from sqlalchemy.sql.sqltypes import BigInteger, Integer
+
+
+class RegionDayStats(SqlAlchemyBase):
+    """Orders completed in a region during a day, RegionHourStats summed up so that long ranges read fewer rows."""
+    __tablename__ = 'region_day_stats'
+
+    region = Column(Integer, primary_key=True)
+    # Days since the epoch, UTC
+    day = Column(Integer, primary_key=True, index=True)
+    count = Column(Integer, nullable=False, default=0)
+    total = Column(BigInteger, nullable=False, default=0)
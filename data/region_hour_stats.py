@@ -0,0 +1,15 @@
+from .db_session import SqlAlchemyBase
+from sqlalchemy import Column
+from sqlalchemy.sql.sqltypes import BigInteger, Integer
+
+
+class RegionHourStats(SqlAlchemyBase):
+    """Orders completed in a region during an hour, for GET /analytics."""
+    __tablename__ = 'region_hour_stats'
+
+    region = Column(Integer, primary_key=True)
+    # Hours since the epoch, complete_time // HOUR_MS
+    hour = Column(Integer, primary_key=True, index=True)
+    count = Column(Integer, nullable=False, default=0)
+    # Delivery time of the orders in seconds
+    total = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,145 @@
+"""Plans deliveries for all idle couriers at once and stages them for POST /orders/assign.
+
+/orders/assign on its own is first come, first served: the courier who asks first takes the lightest orders of their
+regions and whoever asks later gets what is left. This job looks at every idle courier and every free order together,
+spreads the orders over the couriers and writes the plan to orders.staged_courier_id, so that the next /orders/assign
+of each courier returns the orders planned for it. Other couriers leave a planned order alone for DISPATCH_STAGE_TTL
+seconds only: planning again does not extend that, and couriers that let their plan expire are not planned for while
+the orders stay free, so orders do not wait for couriers that have stopped asking. Run it periodically, e.g. from cron:
+
+    * * * * * cd /path/to/candy_delivery_app && python3 dispatch.py
+"""
+import heapq
+import time
+from collections import defaultdict, namedtuple
+from operator import attrgetter
+
+import sqlalchemy as sa
+
+from api.logic import calculate_capacity, check_masks, current_time, stage_expiry
+from config import DATABASE, DISPATCH_TIME_BUDGET, PACKING_STRATEGY
+from data.courier import Courier
+from data.db_session import create_session, global_init
+from data.order import Order
+
+Candidate = namedtuple('Candidate', 'order_id weight region delivery_mask')
+STAGE_CHUNK_SIZE = 5000
+
+
+def plan(couriers, orders, strategy='greedy', time_budget=DISPATCH_TIME_BUDGET) -> dict:
+    """Distributes orders over couriers, returns the ids of the orders planned for each courier by courier_id.
+
+    'greedy' takes the orders lightest first, which maximizes the number of delivered orders, and gives each one to the
+    matching courier with the largest share of its capacity left, so that orders are spread over as many couriers as
+    possible. 'knapsack' takes them heaviest first to the courier with the most capacity left (worst fit decreasing),
+    which maximizes the delivered weight. Couriers with the same working hours in a region are interchangeable and
+    share a heap. Orders not reached within time_budget seconds stay unplanned."""
+    deadline = time.perf_counter() + time_budget
+    capacity = {courier.courier_id: calculate_capacity(courier.courier_type) for courier in couriers}
+    left = dict(capacity)
+    lightest_first = strategy != 'knapsack'
+
+    def priority(courier_id):
+        return -left[courier_id] / capacity[courier_id] if lightest_first else -left[courier_id]
+
+    groups = defaultdict(list)
+    for courier in couriers:
+        for region in set(courier.regions):
+            groups[(region, courier.working_mask)].append((priority(courier.courier_id), courier.courier_id))
+    region_groups = defaultdict(list)
+    for key, heap in groups.items():
+        heapq.heapify(heap)
+        region_groups[key[0]].append(key)
+
+    compatible = dict()
+    deliveries = defaultdict(list)
+    for i, order in enumerate(sorted(orders, key=attrgetter('weight'), reverse=not lightest_first)):
+        if i % 1024 == 0 and time.perf_counter() > deadline:
+            break
+        key = (order.region, order.delivery_mask)
+        if key not in compatible:
+            keys = region_groups.get(order.region, list())
+            matches = check_masks(order.delivery_mask, [mask for _, mask in keys]) if keys else list()
+            compatible[key] = [group for group, match in zip(keys, matches) if match]
+
+        best = None
+        for group in compatible[key]:
+            heap = groups[group]
+            while heap:
+                courier_id = heap[0][1]
+                if heap[0][0] != priority(courier_id):
+                    # The courier has been loaded in another region since its entry here was pushed
+                    heapq.heapreplace(heap, (priority(courier_id), courier_id))
+                elif lightest_first and left[courier_id] - order.weight < 0:
+                    # Orders only get heavier, it will not take any other one either
+                    heapq.heappop(heap)
+                else:
+                    break
+            if heap and left[heap[0][1]] - order.weight >= 0 and (best is None or heap[0] < groups[best][0]):
+                best = group
+        if best is None:
+            continue
+
+        courier_id = groups[best][0][1]
+        left[courier_id] -= order.weight
+        heapq.heapreplace(groups[best], (priority(courier_id), courier_id))
+        deliveries[courier_id].append(order.order_id)
+    return dict(deliveries)
+
+
+def load(session, now: int):
+    """Returns idle couriers and free orders, orders with the same delivery hours share one mask object. Couriers that
+    have not come for the orders planned for them in time are left out."""
+    stale = sa.select([Order.staged_courier_id]) \
+        .where(Order.staged_courier_id != None).where(Order.staged_time <= stage_expiry(now)) \
+        .where(Order.courier_id == None).where(Order.complete_time == None)
+    couriers = session.query(Courier).filter(Courier.assign_time == None, Courier.courier_id.notin_(stale)).all()
+    masks = dict()
+    orders = [Candidate(order_id, weight, region, masks.setdefault(mask, mask))
+              for order_id, weight, region, mask in session.query(
+                  Order.order_id, Order.weight, Order.region, Order.delivery_mask)
+              .filter(Order.courier_id == None, Order.complete_time == None).yield_per(STAGE_CHUNK_SIZE)]
+    return couriers, orders
+
+
+def stage_rows(deliveries, staged, now: int) -> list:
+    """Rows to stage deliveries with. An order planned for the same courier again keeps the staged_time it has in
+    staged, (courier_id, staged_time) by order_id, so that its time to be claimed is not extended."""
+    rows = list()
+    for courier_id, order_ids in deliveries.items():
+        for order_id in order_ids:
+            previous_courier_id, staged_time = staged.get(order_id, (None, None))
+            rows.append({'order': order_id, 'courier': courier_id,
+                         'time': staged_time if previous_courier_id == courier_id else now})
+    return rows
+
+
+def stage(session, deliveries, now: int):
+    """Replaces the previous plan with deliveries. Expired plans of couriers left out by load stay in place, they no
+    longer keep the orders from anyone and keep those couriers out of planning until the orders are taken."""
+    live = (Order.staged_courier_id != None, Order.staged_time > stage_expiry(now))
+    staged = {order_id: (courier_id, staged_time) for order_id, courier_id, staged_time in session.query(
+        Order.order_id, Order.staged_courier_id, Order.staged_time).filter(*live).yield_per(STAGE_CHUNK_SIZE)}
+    session.query(Order).filter(*live) \
+        .update({Order.staged_courier_id: None, Order.staged_time: None}, synchronize_session=False)
+    rows = stage_rows(deliveries, staged, now)
+    statement = Order.__table__.update().where(Order.order_id == sa.bindparam('order')) \
+        .values(staged_courier_id=sa.bindparam('courier'), staged_time=sa.bindparam('time'))
+    for start in range(0, len(rows), STAGE_CHUNK_SIZE):
+        session.execute(statement, rows[start:start + STAGE_CHUNK_SIZE])
+    session.commit()
+
+
+def main():
+    global_init(DATABASE)
+    session = create_session()
+    started, now = time.perf_counter(), current_time()
+    couriers, orders = load(session, now)
+    deliveries = plan(couriers, orders, PACKING_STRATEGY, DISPATCH_TIME_BUDGET)
+    stage(session, deliveries, now)
+    print(f'Staged {sum(map(len, deliveries.values()))} of {len(orders)} free orders for {len(deliveries)} of '
+          f'{len(couriers)} idle couriers in {time.perf_counter() - started:.1f} s.')
+
+
+if __name__ == '__main__':
+    main()
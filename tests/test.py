@@ -1,4 +1,6 @@
 import datetime
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 
 
@@ -152,6 +154,33 @@ class TestCouriersPost:
         assert (request.status_code, request.json()) == (
             400, {'validation_error': {'couriers': [{'id': 4, 'errors': ['Regions must be positive integers.']}]}})
 
+    def test_duplicate_ids(self):
+        request = requests.post(ADDRESS + 'couriers', json={
+            "data": [
+                {
+                    "courier_id": 1,
+                    "courier_type": 'car',
+                    "regions": [1],
+                    "working_hours": ['15:00-18:00']
+                },
+                {
+                    "courier_id": 4,
+                    "courier_type": 'car',
+                    "regions": [1],
+                    "working_hours": ['15:00-18:00']
+                },
+                {
+                    "courier_id": 4,
+                    "courier_type": 'foot',
+                    "regions": [2],
+                    "working_hours": ['10:00-12:00']
+                }
+            ]
+        })
+        assert (request.status_code, request.json()) == (400, {'validation_error': {'couriers': [
+            {'id': 1, 'errors': ['Courier ID must be unique.']}, {'id': 4, 'errors': ['Courier ID must be unique.']}]}})
+        assert requests.get(ADDRESS + 'couriers/4').status_code == 404
+
 
 class TestCouriersPatch:
     def test_correct_input(self):
@@ -230,6 +259,22 @@ class TestCouriersPatch:
         })
         assert request.json()['orders'] == [{'id': 51}]
 
+    def test_releasing_incompatible_orders_first(self):
+        requests.post(ADDRESS + 'couriers', json={'data': [
+            {'courier_id': 2300, 'courier_type': 'car', 'regions': [2301, 2302], 'working_hours': ['09:00-18:00']},
+            {'courier_id': 2301, 'courier_type': 'foot', 'regions': [2301, 2302], 'working_hours': ['09:00-18:00']}]})
+        requests.post(ADDRESS + 'orders', json={'data': [
+            {'order_id': 230001, 'weight': 6, 'region': 2301, 'delivery_hours': ['10:00-11:00']},
+            {'order_id': 230002, 'weight': 5, 'region': 2301, 'delivery_hours': ['10:00-11:00']},
+            {'order_id': 230003, 'weight': 4, 'region': 2301, 'delivery_hours': ['10:00-11:00']},
+            {'order_id': 230004, 'weight': 1, 'region': 2302, 'delivery_hours': ['10:00-11:00']}]})
+        requests.post(ADDRESS + 'orders/assign', json={'courier_id': 2300})
+        requests.patch(ADDRESS + 'couriers/2300', json={'courier_type': 'foot', 'regions': [2301]})
+        request = requests.post(ADDRESS + 'orders/assign', json={'courier_id': 2300})
+        assert request.json()['orders'] == [{'id': 230001}, {'id': 230003}]
+        request = requests.post(ADDRESS + 'orders/assign', json={'courier_id': 2301})
+        assert sorted(order['id'] for order in request.json()['orders']) == [230002, 230004]
+
 
 class TestOrdersPost:
     def test_correct_input(self):
@@ -425,6 +470,42 @@ class TestOrdersPost:
             'Order ID must be positive integer.', 'Weight must be specified.', 'Region must be positive integer.',
             'Wrong time interval format. Correct usage: "HH:MM-HH:MM"']}]}})
 
+    def test_large_batch(self):
+        data = [{"order_id": 100000 + i, "weight": 1, "region": 7777, "delivery_hours": ["09:00-18:00"]}
+                for i in range(20000)]
+        data[5000]['weight'] = 'heavy'
+        data[15000]['delivery_hours'] = ['9:00-18:00']
+        request = requests.post(ADDRESS + 'orders', json={'data': data})
+        assert (request.status_code, request.json()) == (400, {'validation_error': {'orders': [
+            {'id': 105000, 'errors': ['Weight must be float.']},
+            {'id': 115000, 'errors': ['Wrong time interval format. Correct usage: "HH:MM-HH:MM"']}]}})
+
+        data[5000]['weight'] = 1.5
+        data[15000]['delivery_hours'] = ['09:00-18:00']
+        request = requests.post(ADDRESS + 'orders', json={'data': data})
+        assert (request.status_code, request.json()) == (201, {'orders': [{'id': 100000 + i} for i in range(20000)]})
+
+    def test_large_batch_without_id(self):
+        data = [{"order_id": 130000 + i, "weight": 1, "region": 7778, "delivery_hours": ["09:00-18:00"]}
+                for i in range(20000)]
+        del data[10000]['order_id']
+        request = requests.post(ADDRESS + 'orders', json={'data': data})
+        assert request.status_code == 400
+
+    def test_duplicate_id(self):
+        request = requests.post(ADDRESS + 'orders', json={
+            "data": [
+                {
+                    "order_id": 11,
+                    "weight": 1,
+                    "region": 12,
+                    "delivery_hours": ['13:00-23:00']
+                }
+            ]
+        })
+        assert (request.status_code, request.json()) == (
+            400, {'validation_error': {'orders': [{'id': 11, 'errors': ['Order ID must be unique.']}]}})
+
 
 class TestOrdersAssignPost:
     def test_correct_input(self):
@@ -455,6 +536,36 @@ class TestOrdersAssignPost:
         })
         assert (request.status_code, request.json()) == (200, {'orders': []})
 
+    def test_orders_after_empty_order_list(self):
+        requests.post(ADDRESS + 'couriers', json={
+            "data": [
+                {
+                    "courier_id": 501,
+                    "courier_type": "car",
+                    "regions": [98],
+                    "working_hours": ["09:00-18:00"]
+                }
+            ]
+        })
+        request = requests.post(ADDRESS + 'orders/assign', json={
+            'courier_id': 501
+        })
+        assert (request.status_code, request.json()) == (200, {'orders': []})
+        requests.post(ADDRESS + 'orders', json={
+            "data": [
+                {
+                    "order_id": 980001,
+                    "weight": 3,
+                    "region": 98,
+                    "delivery_hours": ["10:00-11:00"]
+                }
+            ]
+        })
+        request = requests.post(ADDRESS + 'orders/assign', json={
+            'courier_id': 501
+        })
+        assert (request.status_code, request.json()['orders']) == (200, [{'id': 980001}])
+
     def test_completed_order(self):
         requests.post(ADDRESS + 'orders', json={
             "data": [
@@ -526,6 +637,116 @@ class TestOrdersAssignPost:
         request = requests.post(ADDRESS + 'orders/assign', json={'courier_id': 600})
         assert request.json()['orders'] == [{'id': 303}, {'id': 304}, {'id': 302}]
 
+    def test_parallel_assign(self):
+        couriers = list(range(7000, 7020))
+        requests.post(ADDRESS + 'couriers', json={'data': [
+            {'courier_id': courier_id, 'courier_type': 'car', 'regions': [7070], 'working_hours': ['09:00-18:00']}
+            for courier_id in couriers]})
+        requests.post(ADDRESS + 'orders', json={'data': [
+            {'order_id': order_id, 'weight': 5, 'region': 7070, 'delivery_hours': ['10:00-12:00']}
+            for order_id in range(70000, 70300)]})
+
+        def assign(courier_id):
+            return courier_id, requests.post(ADDRESS + 'orders/assign', json={'courier_id': courier_id}).json()
+
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            responses = list(executor.map(assign, couriers * 2))
+
+        deliveries = dict()
+        for courier_id, response in responses:
+            orders = [order['id'] for order in response['orders']]
+            assert deliveries.setdefault(courier_id, orders) == orders
+        assigned = [order_id for orders in deliveries.values() for order_id in orders]
+        assert len(assigned) == len(set(assigned)) == 200
+
+
+class TestOrdersAssignBulkPost:
+    def test_correct_input(self):
+        types = {9100: 'foot', 9101: 'bike', 9102: 'car', 9103: 'car', 9104: 'foot'}
+        couriers = [{'courier_id': courier_id, 'courier_type': courier_type, 'regions': [9191],
+                     'working_hours': ['09:00-18:00']} for courier_id, courier_type in types.items()]
+        couriers.append({'courier_id': 9105, 'courier_type': 'car', 'regions': [9191], 'working_hours': ['19:00-20:00']})
+        requests.post(ADDRESS + 'couriers', json={'data': couriers})
+        weights = {order_id: 1 + order_id % 5 for order_id in range(910000, 910060)}
+        requests.post(ADDRESS + 'orders', json={'data': [
+            {'order_id': order_id, 'weight': weight, 'region': 9191, 'delivery_hours': ['10:00-12:00']}
+            for order_id, weight in weights.items()]})
+
+        request = requests.post(ADDRESS + 'orders/assign/bulk', json={
+            'courier_ids': [9100, 9101, 9102, 9103, 9104, 9105, 9999, 9100]})
+        couriers = request.json()['couriers']
+        assert (request.status_code, [courier['courier_id'] for courier in couriers],
+                [courier['status'] for courier in couriers]) == \
+               (200, [9100, 9101, 9102, 9103, 9104, 9105, 9999, 9100], [200] * 6 + [400, 200])
+        assert couriers[0] == couriers[-1] and couriers[5]['orders'] == []
+
+        capacity = {'foot': 10, 'bike': 15, 'car': 50}
+        assigned = list()
+        for courier in couriers[:5]:
+            orders = [order['id'] for order in courier['orders']]
+            assert 0 < sum(weights[order_id] for order_id in orders) <= capacity[types[courier['courier_id']]]
+            assigned.extend(orders)
+        assert len(assigned) == len(set(assigned))
+
+        request = requests.post(ADDRESS + 'orders/assign', json={'courier_id': 9102}).json()
+        assert (sorted(order['id'] for order in request['orders']), request['assign_time']) == \
+               (sorted(order['id'] for order in couriers[2]['orders']), couriers[2]['assign_time'])
+
+    def test_wrong_body(self):
+        request = requests.post(ADDRESS + 'orders/assign/bulk', json={'courier_id': 1})
+        assert request.status_code == 400
+
+    def test_parallel_bulk_assign(self):
+        couriers = list(range(7100, 7110))
+        requests.post(ADDRESS + 'couriers', json={'data': [
+            {'courier_id': courier_id, 'courier_type': 'foot', 'regions': [7171], 'working_hours': ['09:00-18:00']}
+            for courier_id in couriers]})
+        requests.post(ADDRESS + 'orders', json={'data': [
+            {'order_id': order_id, 'weight': 3, 'region': 7171, 'delivery_hours': ['10:00-12:00']}
+            for order_id in range(71000, 71100)]})
+
+        def assign(_):
+            return requests.post(ADDRESS + 'orders/assign/bulk', json={'courier_ids': couriers}).json()['couriers']
+
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            responses = list(executor.map(assign, range(6)))
+
+        deliveries = dict()
+        for response in responses:
+            for courier in response:
+                orders = sorted(order['id'] for order in courier['orders'])
+                assert deliveries.setdefault(courier['courier_id'], orders) == orders
+        for courier_id in couriers:
+            request = requests.post(ADDRESS + 'orders/assign', json={'courier_id': courier_id}).json()
+            assert sorted(order['id'] for order in request['orders']) == deliveries[courier_id]
+        assigned = [order_id for orders in deliveries.values() for order_id in orders]
+        assert len(assigned) == len(set(assigned)) == 30
+
+
+class TestOrderCouriersGet:
+    def test_correct_input(self):
+        requests.post(ADDRESS + 'couriers', json={'data': [
+            {'courier_id': 9200, 'courier_type': 'foot', 'regions': [9292], 'working_hours': ['09:00-12:00']},
+            {'courier_id': 9201, 'courier_type': 'car', 'regions': [9292], 'working_hours': ['14:00-18:00']},
+            {'courier_id': 9202, 'courier_type': 'car', 'regions': [9293], 'working_hours': ['09:00-18:00']},
+            {'courier_id': 9203, 'courier_type': 'bike', 'regions': [9293, 9292], 'working_hours': ['10:59-11:30']}]})
+        requests.post(ADDRESS + 'orders', json={'data': [
+            {'order_id': 920001, 'weight': 5, 'region': 9292, 'delivery_hours': ['10:00-11:00']},
+            {'order_id': 920002, 'weight': 12, 'region': 9292, 'delivery_hours': ['10:00-11:00']}]})
+        request = requests.get(ADDRESS + 'orders/920001/couriers')
+        assert (request.status_code, request.json()) == (200, {'order_id': 920001, 'couriers': [9200, 9203]})
+        request = requests.get(ADDRESS + 'orders/920002/couriers')
+        assert (request.status_code, request.json()) == (200, {'order_id': 920002, 'couriers': [9203]})
+
+        requests.patch(ADDRESS + 'couriers/9201', json={'working_hours': ['10:30-12:00']})
+        requests.patch(ADDRESS + 'couriers/9203', json={'regions': [9293]})
+        request = requests.get(ADDRESS + 'orders/920002/couriers')
+        assert (request.status_code, request.json()) == (200, {'order_id': 920002, 'couriers': [9201]})
+
+    def test_nonexistent_order_id(self):
+        request = requests.get(ADDRESS + 'orders/929999/couriers')
+        assert request.status_code == 404
+
 
 class TestOrdersCompletePost:
     def test_correct_input(self):
@@ -603,6 +824,41 @@ class TestOrdersCompletePost:
         })
         assert (request.status_code, request.json()) == (200, {'order_id': 5551})
 
+    def test_wrong_time_format(self):
+        for complete_time in ("2021-01-10T10:33:01.42", "10.01.2021 10:33", 1610274781420):
+            request = requests.post(ADDRESS + 'orders/complete', json={
+                "courier_id": 5000,
+                "order_id": 5551,
+                "complete_time": complete_time
+            })
+            assert request.status_code == 400
+
+
+class TestOrdersCompleteBulkPost:
+    def test_completions_in_time_order(self):
+        requests.post(ADDRESS + 'couriers', json={'data': [
+            {'courier_id': 8000, 'courier_type': 'car', 'regions': [808], 'working_hours': ['00:00-24:00']}]})
+        requests.post(ADDRESS + 'orders', json={'data': [
+            {'order_id': order_id, 'weight': 1, 'region': 808, 'delivery_hours': ['00:00-24:00']}
+            for order_id in (80001, 80002, 80003)]})
+        requests.post(ADDRESS + 'orders/assign', json={'courier_id': 8000})
+        dt = datetime.datetime.utcnow()
+        request = requests.post(ADDRESS + 'orders/complete/bulk', json={'data': [
+            {'courier_id': 8000, 'order_id': 80002, 'complete_time': format_date(dt + datetime.timedelta(minutes=20))},
+            {'courier_id': 8000, 'order_id': 80001, 'complete_time': format_date(dt + datetime.timedelta(minutes=10))},
+            {'courier_id': 1, 'order_id': 80003, 'complete_time': format_date(dt + datetime.timedelta(minutes=30))},
+            {'courier_id': 8000, 'order_id': 89999, 'complete_time': format_date(dt + datetime.timedelta(minutes=30))},
+            {'courier_id': 8000, 'order_id': 80003, 'complete_time': format_date(dt + datetime.timedelta(minutes=30))}
+        ]})
+        assert (request.status_code, [order['status'] for order in request.json()['orders']]) == \
+               (200, [200, 200, 400, 400, 200])
+        request = requests.get(ADDRESS + 'couriers/8000').json()
+        assert (request['earnings'], request['rating']) == (4500, 4.17)
+
+    def test_wrong_body(self):
+        request = requests.post(ADDRESS + 'orders/complete/bulk', json={'orders': []})
+        assert request.status_code == 400
+
 
 class TestCouriersGet:
     def test_correct_input_without_rating(self):
@@ -662,6 +918,13 @@ class TestCouriersGet:
                                                                'working_hours': ['11:35-14:05', '09:00-11:00'],
                                                                'rating': 3.67, 'earnings': 2000})
 
+    def test_repeated_completion_keeps_rating(self):
+        dt = datetime.datetime.utcnow() + datetime.timedelta(hours=2)
+        requests.post(ADDRESS + 'orders/complete', json={'courier_id': 9, 'order_id': 955,
+                                                         'complete_time': format_date(dt)})
+        request = requests.get(ADDRESS + 'couriers/9')
+        assert (request.json()['rating'], request.json()['earnings']) == (3.67, 2000)
+
     def test_nonexistent_courier_id(self):
         request = requests.get(ADDRESS + 'couriers/324234')
         assert request.status_code == 404
@@ -746,3 +1009,69 @@ class TestCouriersGet:
         })
         request = requests.get(ADDRESS + 'couriers/1337').json()
         assert (request['earnings'], request['rating']) == (5500, 4.08)
+
+
+class TestMetricsGet:
+    def test_no_sessions_left_open(self):
+        request = requests.get(ADDRESS + 'metrics')
+        assert (request.status_code, request.json()['open_sessions']) == (200, 0)
+
+
+class TestAnalyticsGet:
+    def test_correct_input(self):
+        requests.post(ADDRESS + 'couriers', json={
+            "data": [{"courier_id": 2500, "courier_type": "foot", "regions": [250], "working_hours": ["00:00-23:59"]}]
+        })
+        requests.post(ADDRESS + 'orders', json={
+            "data": [
+                {"order_id": 250001, "weight": 1, "region": 250, "delivery_hours": ["00:00-23:59"]},
+                {"order_id": 250002, "weight": 2, "region": 250, "delivery_hours": ["00:00-23:59"]}
+            ]
+        })
+        requests.post(ADDRESS + 'orders/assign', json={'courier_id': 2500})
+        requests.post(ADDRESS + 'orders/complete/bulk', json={'data': [
+            {'courier_id': 2500, 'order_id': 250001, 'complete_time': '2019-03-14T10:50:00.00Z'},
+            {'courier_id': 2500, 'order_id': 250002, 'complete_time': '2019-03-14T11:00:00.00Z'}
+        ]})
+        request = requests.get(ADDRESS + 'analytics', params={'from': '2019-03-14T10:30:00Z',
+                                                              'to': '2019-03-14T12:00:00Z', 'region': 250})
+        assert (request.status_code, request.json()) == (200, {
+            'from': '2019-03-14T10:00:00.00Z', 'to': '2019-03-14T12:00:00.00Z', 'step': 'hour',
+            'regions': [{'region': 250, 'orders': 2, 'average_delivery_time': 300.0}],
+            'series': [{'start': '2019-03-14T10:00:00.00Z', 'orders': 1},
+                       {'start': '2019-03-14T11:00:00.00Z', 'orders': 1}],
+            'courier_types': [{'courier_type': 'foot', 'orders': 2, 'deliveries': 1, 'earnings': 1000}]
+        })
+        request = requests.get(ADDRESS + 'analytics', params={'from': '2019-03-13T12:00:00Z',
+                                                              'to': '2019-03-15T00:00:00Z', 'region': 250})
+        assert (request.json()['step'], request.json()['regions']) == \
+               ('hour', [{'region': 250, 'orders': 2, 'average_delivery_time': 300.0}])
+        request = requests.get(ADDRESS + 'analytics', params={'from': '2019-03-14T10:30:00Z',
+                                                              'to': '2019-03-14T12:00:00Z', 'region': 250,
+                                                              'step': 'day'})
+        assert (request.json()['from'], request.json()['series']) == \
+               ('2019-03-14T00:00:00.00Z', [{'start': '2019-03-14T00:00:00.00Z', 'orders': 2}])
+
+    def test_courier_types_of_the_range_only(self):
+        requests.post(ADDRESS + 'couriers', json={
+            "data": [{"courier_id": 2501, "courier_type": "bike", "regions": [251], "working_hours": ["00:00-23:59"]}]
+        })
+        requests.post(ADDRESS + 'orders', json={
+            "data": [{"order_id": 250003, "weight": 1, "region": 251, "delivery_hours": ["00:00-23:59"]}]
+        })
+        requests.post(ADDRESS + 'orders/assign', json={'courier_id': 2501})
+        requests.post(ADDRESS + 'orders/complete', json={'courier_id': 2501, 'order_id': 250003,
+                                                         'complete_time': '2019-03-16T20:00:00.00Z'})
+        request = requests.get(ADDRESS + 'analytics', params={'from': '2019-03-16T08:00:00Z',
+                                                              'to': '2019-03-16T09:00:00Z'})
+        assert (request.status_code, request.json()['regions'], request.json()['courier_types']) == (200, [], [])
+        request = requests.get(ADDRESS + 'analytics', params={'from': '2019-03-16T08:00:00Z',
+                                                              'to': '2019-03-16T21:00:00Z'})
+        assert request.json()['courier_types'] == [
+            {'courier_type': 'bike', 'orders': 1, 'deliveries': 1, 'earnings': 2500}]
+
+    def test_wrong_range(self):
+        for params in ({'from': '2019-03-14T10:30:00Z'}, {'from': '2019-03-14', 'to': '2019-03-15'},
+                       {'from': '2019-03-15T00:00:00Z', 'to': '2019-03-14T00:00:00Z'},
+                       {'from': '2019-03-14T00:00:00Z', 'to': '2019-03-15T00:00:00Z', 'step': 'week'}):
+            assert requests.get(ADDRESS + 'analytics', params=params).status_code == 400
@@ -0,0 +1,279 @@
+import random
+from collections import namedtuple
+
+import pytest
+
+from api.cache import FakeRedis, LocalCache, SharedCache
+from api.eligibility import CourierIndex
+from api.logic import calculate_time, check_time, check_time_batch, current_time, format_date, keep_orders, \
+    pack_orders, parse_date, parse_rfc3339, time_mask
+from api.pool import OrderPool
+from api.schemas import validate_courier, validate_courier_patch, validate_order
+from dispatch import Candidate, plan, stage_rows
+
+
+def random_interval(rng):
+    start = rng.randrange(0, 24 * 60)
+    end = rng.randrange(start + 1, 24 * 60 + 1)
+    return '%02d:%02d-%02d:%02d' % (start // 60, start % 60, end // 60, end % 60)
+
+
+class TestCheckTimeBatch:
+    def assert_equivalent(self, working_hours, delivery_hours):
+        expected = [check_time(working_hours, hours) for hours in delivery_hours]
+        assert check_time_batch(working_hours, delivery_hours).tolist() == expected
+
+    def test_touching_intervals(self):
+        self.assert_equivalent(['09:00-12:00'], [['12:00-14:00'], ['07:00-09:00'], ['11:59-12:00'], ['09:00-09:01']])
+
+    def test_midnight(self):
+        self.assert_equivalent(['00:00-24:00'], [['23:59-24:00'], ['00:00-00:01'], ['12:00-18:00']])
+        self.assert_equivalent(['18:00-24:00'], [['00:00-18:00'], ['23:00-24:00'], ['17:00-18:01']])
+
+    def test_nested_and_identical_intervals(self):
+        self.assert_equivalent(['12:00-18:00'], [['12:00-18:00'], ['13:00-14:00'], ['09:00-21:00']])
+
+    def test_multiple_intervals(self):
+        self.assert_equivalent(['11:35-14:05', '09:00-11:00'],
+                               [['11:00-11:35'], ['09:00-12:00', '16:00-21:30'], ['14:05-15:00', '08:00-09:00']])
+
+    def test_empty_batch(self):
+        assert check_time_batch(['09:00-18:00'], []).tolist() == []
+
+    def test_random_intervals(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            working_hours = [random_interval(rng) for _ in range(rng.randint(1, 3))]
+            delivery_hours = [[random_interval(rng) for _ in range(rng.randint(1, 3))] for _ in range(50)]
+            self.assert_equivalent(working_hours, delivery_hours)
+
+
+class TestPackOrders:
+    class Order:
+        def __init__(self, weight):
+            self.weight = weight
+
+    def pack(self, weights, capacity, strategy, time_budget=1):
+        orders = [self.Order(weight) for weight in sorted(weights)]
+        return [order.weight for order in pack_orders(orders, capacity, strategy, time_budget)]
+
+    def test_greedy_takes_lightest_orders(self):
+        assert self.pack([3, 4, 5, 6], 10, 'greedy') == [3, 4]
+
+    def test_knapsack_fills_capacity(self):
+        assert sum(self.pack([3, 4, 5, 6], 10, 'knapsack')) == 10
+        assert self.pack([0.01, 0.01, 0.01, 9.99], 10, 'knapsack') == [0.01, 9.99]
+
+    def test_knapsack_never_exceeds_capacity(self):
+        rng = random.Random(0)
+        for _ in range(100):
+            weights = [round(rng.uniform(0.01, 20), 2) for _ in range(30)]
+            packed = self.pack(weights, 15, 'knapsack')
+            assert sum(packed) <= 15 + 1e-9
+            assert sum(packed) >= sum(self.pack(weights, 15, 'greedy')) - 1e-9
+            assert sum(self.pack([weight + 0.001 for weight in weights], 15, 'knapsack')) <= 15 + 1e-9
+
+    def test_knapsack_with_fractional_capacity(self):
+        assert self.pack([9.7], 10 - 0.3, 'knapsack') == [9.7]
+        assert self.pack([0.3, 9.4], 10 - 0.3, 'knapsack') == [0.3, 9.4]
+
+    def test_knapsack_without_time_falls_back_to_greedy(self):
+        assert self.pack([3, 4, 5, 6], 10, 'knapsack', time_budget=0) == [3, 4]
+
+    def test_knapsack_reads_only_the_orders_it_needs(self):
+        for weights, time_budget, read in (([3, 4, 5, 6, 7], 0, 3), ([5, 5, 6, 7, 8], 1, 3), ([3, 11, 12], 1, 2)):
+            orders = iter([self.Order(weight) for weight in weights])
+            pack_orders(orders, 10, 'knapsack', time_budget)
+            assert len(list(orders)) == len(weights) - read
+
+    def test_unknown_strategy(self):
+        try:
+            self.pack([1], 10, 'random')
+        except ValueError:
+            return
+        assert False
+
+
+class TestSchemas:
+    def test_courier_errors(self):
+        assert validate_courier({'courier_id': 4, 'courier_type': 13, 'regions': 'bike', 'working_hours': []}) == [
+            'Courier type must be a string.', 'Regions must be an array.',
+            'At least one working time slot is required.']
+        assert validate_courier({'courier_id': 0}) == [
+            'Courier ID must be positive integer.', 'Courier type must be specified.',
+            'Courier regions must be specified.', 'Courier working hours must be specified']
+
+    def test_order_errors(self):
+        assert validate_order({'order_id': 1, 'weight': 1, 'region': 1,
+                               'delivery_hours': ['13:00-25:00', '7:00-12:00', 900]}) == [
+            'There are only 24 hours in a day and 60 minutes in an hour.',
+            'Wrong time interval format. Correct usage: "HH:MM-HH:MM"',
+            'Wrong time interval format. Correct usage: "HH:MM-HH:MM"']
+
+    def test_courier_patch(self):
+        assert validate_courier_patch({}) == []
+        assert validate_courier_patch({'regions': [2, 3]}) == []
+        assert validate_courier_patch({'courier_type': ''}) == [
+            'Courier type must be one of following values: foot, car, bike.']
+        assert validate_courier_patch({'courier_id': 5}) == ['Unknown field courier_id.']
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCourierCache:
+    def test_lru_eviction(self):
+        cache = LocalCache(2, 60)
+        cache.set(1, {'courier_id': 1})
+        cache.set(2, {'courier_id': 2})
+        cache.get(1)
+        cache.set(3, {'courier_id': 3})
+        assert (cache.get(1), cache.get(2), cache.get(3)) == ({'courier_id': 1}, None, {'courier_id': 3})
+        assert cache.stats() == {'hits': 3, 'misses': 1, 'evictions': 1, 'size': 2}
+
+    def test_ttl_and_delete(self):
+        clock = Clock()
+        cache = LocalCache(10, 5, clock)
+        cache.set(1, {'courier_id': 1})
+        cache.set(2, {'courier_id': 2})
+        cache.delete(2)
+        clock.now = 4
+        assert (cache.get(1), cache.get(2)) == ({'courier_id': 1}, None)
+        clock.now = 5
+        assert cache.get(1) is None
+
+    def test_shared_cache(self):
+        clock = Clock()
+        client = FakeRedis(clock)
+        first, second = SharedCache(client, 5), SharedCache(client, 5)
+        first.set(1, {'courier_id': 1, 'rating': 4.5})
+        assert second.get(1) == {'courier_id': 1, 'rating': 4.5}
+        second.delete(1)
+        assert first.get(1) is None
+        first.set(2, {'courier_id': 2})
+        clock.now = 5
+        assert second.get(2) is None
+        assert (first.stats()['misses'], second.stats()['hits'], second.stats()['misses']) == (1, 1, 1)
+
+
+DispatchCourier = namedtuple('DispatchCourier', 'courier_id courier_type regions working_mask')
+
+
+class TestDispatchPlan:
+    day = time_mask(['09:00-18:00'])
+
+    def order(self, order_id, weight, region=1, hours=('10:00-12:00',)):
+        return Candidate(order_id, weight, region, time_mask(list(hours)))
+
+    def test_orders_are_spread_over_couriers(self):
+        couriers = [DispatchCourier(1, 'foot', [1], self.day), DispatchCourier(2, 'foot', [1], self.day)]
+        deliveries = plan(couriers, [self.order(i, 1) for i in range(1, 5)], time_budget=10)
+        assert sorted(map(len, deliveries.values())) == [2, 2]
+
+    def test_regions_hours_and_capacity(self):
+        couriers = [DispatchCourier(1, 'foot', [1, 2], self.day), DispatchCourier(2, 'car', [3], self.day)]
+        orders = [self.order(1, 6, region=1), self.order(2, 6, region=2), self.order(3, 1, region=2),
+                  self.order(4, 1, region=1, hours=['19:00-20:00']), self.order(5, 1, region=4)]
+        assert plan(couriers, orders, time_budget=10) == {1: [3, 1]}
+
+    def test_knapsack_takes_heaviest_first(self):
+        couriers = [DispatchCourier(1, 'foot', [1], self.day)]
+        orders = [self.order(1, 1), self.order(2, 2), self.order(3, 9)]
+        assert (plan(couriers, orders, 'greedy', 10), plan(couriers, orders, 'knapsack', 10)) == \
+               ({1: [1, 2]}, {1: [3, 1]})
+
+    def test_time_budget(self):
+        couriers = [DispatchCourier(1, 'foot', [1], self.day)]
+        assert plan(couriers, [self.order(1, 1)], time_budget=-1) == dict()
+
+    def test_planning_again_keeps_stage_time(self):
+        rows = stage_rows({1: [10, 11], 2: [12]}, {10: (1, 500), 11: (2, 500)}, 900)
+        assert [row['time'] for row in rows] == [500, 900, 900]
+
+
+class TestCourierIndex:
+    def test_eligible(self):
+        index = CourierIndex(10)
+        index.put(1, [1, 2], time_mask(['09:00-12:00']), 'foot')
+        index.put(2, [1], time_mask(['14:00-18:00']), 'car')
+        index.put(3, [2], time_mask(['11:59-12:30']), 'bike')
+        mask = time_mask(['11:00-12:00'])
+        assert (index.eligible(1, mask, 5), index.eligible(2, mask, 5), index.eligible(2, mask, 12),
+                index.eligible(3, mask, 1)) == ([1], [1, 3], [3], [])
+        index.put(2, [1], time_mask(['11:30-11:31']), 'car')
+        assert index.eligible(1, mask, 5) == [1, 2]
+
+    def test_empty_marks(self):
+        clock = Clock()
+        index = CourierIndex(10, clock=clock)
+        index.built = True
+        index.put(1, [1], time_mask(['09:00-12:00']), 'foot')
+        index.put(2, [2], time_mask(['09:00-12:00']), 'foot')
+        version = index.current_version()
+        index.orders_added({3})
+        index.mark_empty(1, version)
+        assert not index.is_empty(1)
+
+        index.mark_empty(1, index.current_version())
+        index.mark_empty(2, index.current_version())
+        index.orders_added({2})
+        assert (index.is_empty(1), index.is_empty(2)) == (True, False)
+        index.forget([1])
+        assert not index.is_empty(1)
+
+        index.mark_empty(1, index.current_version())
+        clock.now = 10
+        assert not index.is_empty(1)
+        assert index.stats() == {'couriers': 2, 'empty': 0, 'skipped_scans': 1}
+
+
+class TestOrderPool:
+    def test_candidates(self):
+        pool = OrderPool()
+        mask = time_mask(['10:00-12:00'])
+        pool.add([(1, 5, 1, mask), (2, 1, 1, mask), (3, 3, 2, mask), (4, 3, 1, mask), (5, 1, 3, mask)])
+        pool.add([(2, 1, 1, mask)])
+        assert [order.order_id for order in pool.candidates([1, 2], 4)] == [2, 3, 4]
+        pool.remove([4, 3, 42])
+        assert [order.order_id for order in pool.candidates([1, 2, 2], 10)] == [2, 1]
+        assert pool.stats() == {'enabled': False, 'size': 3}
+
+
+class TestKeepOrders:
+    def test_incompatible_orders_go_first(self):
+        mask = time_mask(['10:00-11:00'])
+        orders = [Candidate(4, 1, 2, mask), Candidate(3, 4, 1, mask), Candidate(2, 5, 1, mask),
+                  Candidate(1, 6, 1, mask), Candidate(5, 2, 1, time_mask(['19:00-20:00']))]
+        kept = keep_orders(sorted(orders, key=lambda order: order.weight), [1], time_mask(['09:00-18:00']), 10)
+        assert [order.order_id for order in kept] == [3, 1]
+
+    def test_everything_fits(self):
+        mask = time_mask(['10:00-11:00'])
+        orders = [Candidate(1, 1, 1, mask), Candidate(2, 2, 1, mask)]
+        assert keep_orders(orders, [1], mask, 10) == orders
+
+
+class TestTimestamps:
+    def test_parse_and_format(self):
+        assert parse_date('2021-01-10T10:33:01.42Z') == 1610274781420
+        assert parse_date('2021-01-10T13:33:01.42+03:00') == 1610274781420
+        assert parse_rfc3339('2021-01-10T13:33:01.42+03:00').timestamp() * 1000 == 1610274781420
+        assert parse_rfc3339('2021-01-10T10:33:01.4217Z').microsecond == 421700
+        assert format_date(1610274781420) == '2021-01-10T10:33:01.42Z'
+        assert format_date(parse_date('2021-01-10T10:33:01Z')) == '2021-01-10T10:33:01.00Z'
+        now = current_time()
+        assert format_date(now) == format_date(parse_date(format_date(now)))
+
+    def test_wrong_format(self):
+        for date in ('2021-01-10T10:33:01.42', '2021-02-30T10:33:01.42Z', '10.01.2021 10:33', None, 1610274781420):
+            with pytest.raises(ValueError):
+                parse_date(date)
+
+    def test_durations(self):
+        assert calculate_time(parse_date('2021-01-10T10:00:00Z'), parse_date('2021-01-12T10:00:01.50Z')) == 172801
+        assert calculate_time(parse_date('2021-01-10T10:00:00Z'), parse_date('2021-01-10T09:00:00Z')) == 0